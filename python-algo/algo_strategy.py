@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -16,7 +15,8 @@ Advanced strategy tips:
 
   - The GameState.map object can be manually manipulated to create hypothetical 
   board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  the actual current map state. GameState.fork() makes a cheap copy of the
+  whole state to try moves on.
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
@@ -43,6 +43,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         SP = 0
         # This is a good place to do initial setup
         self.scored_on_locations = []
+        # We only look at breaches, so only decode those and skip frames without any
+        self.frame_events = ["breach"]
 
     def on_turn(self, turn_state):
         """
@@ -52,7 +54,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         unit deployments, and transmitting your intended deployments to the
         game engine.
         """
-        game_state = gamelib.GameState(self.config, turn_state)
+        game_state = gamelib.GameState(self.config, turn_state, self.budget, parsed_state=self.parsed_state)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
 
@@ -183,26 +185,27 @@ class AlgoStrategy(gamelib.AlgoCore):
         estimate the path's damage risk.
         """
         damages = []
-        # Get the damage estimate each path will take
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
-            damages.append(damage)
-        
+        # The threat map holds the damage enemy turrets deal each frame to every location
+        threat = game_state.threat_map(0)
+        # Get the damage estimate each path will take, pathing from every option in a single pass
+        paths = game_state.find_paths_to_edge_batch(location_options)
+        for path in paths:
+            # The path is None if the location is blocked or the time budget ran out before reaching it
+            damages.append(math.inf if path is None else threat.path_damage(path))
+
+        # Fall back to the first option if no path was found
+        if min(damages, default=math.inf) == math.inf:
+            return location_options[0]
         # Now just return the location that takes the least damage
         return location_options[damages.index(min(damages))]
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-        total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units
+        """
+        Counts the enemy structures of a type, or of every type, in the given columns and rows.
+        The count comes from game_state.unit_table(), which holds the units sent by the engine at the start
+        of the turn, so units added to game_state.game_map since then are not counted.
+        """
+        return game_state.unit_table().count(player_index=1, unit_type=unit_type, x_range=valid_x, y_range=valid_y, stationary=True)
         
     def filter_blocked_locations(self, locations, game_state):
         filtered = []
@@ -211,17 +214,16 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
+    def on_frame_events(self, frame, turn_string):
         """
         This is the action frame of the game. This function could be called 
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
         Processing the action frames is complicated so we only suggest it if you have time and experience.
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
+        Since frame_events is set, only frames with a breach get here, and frame only holds the events we asked for.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
+        breaches = frame["breach"]
         for breach in breaches:
             location = breach[0]
             unit_owner_self = True if breach[4] == 1 else False
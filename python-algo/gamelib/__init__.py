@@ -24,6 +24,10 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .rollout import RolloutPool
+from .unit_table import UnitTable
+from .rules import RulesTable
+from .path_table import PathTable
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["action_phase", "algocore", "bitboard", "board_tables", "game_state", "game_map", "navigation", "path_table", "rollout", "rules", "simulator", "threat_map", "time_budget", "unit", "unit_table", "util"]
  
\ No newline at end of file
@@ -0,0 +1,133 @@
+import json
+
+
+class ActionPhaseTracker:
+    """Follows the board through the frames of action phases, by unit id
+
+    Every frame carries the whole p1Units and p2Units lists. The tracker keeps one record per
+    unit and only updates the records that changed, so after each frame you can read what
+    happened in it without rebuilding a GameMap.
+
+        def on_action_frame_parsed(self, frame, frame_string):
+            self.tracker.update(frame)
+            for unit_id in self.tracker.died:
+                ...
+
+    Unit records are lists [unit type index, player index, x, y, health], where the unit type index
+    is the index in config["unitInformation"] and the player index is 0 for you and 1 for your opponent.
+    The last two unit lists of a frame, the locations being removed and upgraded, are not tracked.
+    Structures built during the deploy phase show up as spawned in the first frame after it.
+
+    Attributes :
+        * units (dict): The record of every unit on the board, by unit id
+        * turn_number (int): The turn of the last frame applied, -1 before the first one
+        * frame_number (int): The number of the last frame applied in its action phase, -1 before the first one
+        * spawned (list): The ids of the units that appeared in the last frame
+        * moved (dict): For each unit that moved in the last frame, its [x, y] before the move
+        * damaged (dict): For each unit that lost health in the last frame, its health before
+        * shielded (dict): For each unit that gained health in the last frame, its health before
+        * died (dict): The last record of each unit that disappeared in the last frame
+
+    """
+    def __init__(self):
+        self.units = {}
+        self.turn_number = -1
+        self.frame_number = -1
+        self.spawned = []
+        self.moved = {}
+        self.damaged = {}
+        self.shielded = {}
+        self.died = {}
+        self.__at = {}
+
+    def reset(self):
+        """Forgets every unit, for example when a new game starts
+        """
+        self.__init__()
+
+    def units_at(self, location):
+        """Gets the ids of the units standing at a location
+
+        Args:
+            location: The location to look at
+
+        Returns:
+            A list of unit ids, empty if there are none
+
+        """
+        return list(self.__at.get((location[0], location[1]), ()))
+
+    def update(self, frame):
+        """Applies an action frame
+
+        Args:
+            frame: The frame, either as the json string sent by the engine or already decoded.
+                Only its turnInfo, p1Units and p2Units are read.
+
+        Returns:
+            The tracker, with spawned, moved, damaged, shielded and died describing this frame
+
+        """
+        if isinstance(frame, str):
+            frame = json.loads(frame)
+        turn_info = frame.get("turnInfo")
+        if turn_info is not None:
+            self.turn_number = int(turn_info[1])
+            self.frame_number = int(turn_info[2])
+
+        units = self.units
+        spawned = []
+        moved = {}
+        damaged = {}
+        shielded = {}
+        seen = set()
+        for player_index, key in ((0, "p1Units"), (1, "p2Units")):
+            unit_lists = frame.get(key) or []
+            for type_index in range(max(0, len(unit_lists) - 2)):
+                for x, y, health, unit_id in unit_lists[type_index]:
+                    seen.add(unit_id)
+                    record = units.get(unit_id)
+                    if record is None:
+                        units[unit_id] = [type_index, player_index, x, y, health]
+                        self.__place(unit_id, x, y)
+                        spawned.append(unit_id)
+                        continue
+                    if record[2] != x or record[3] != y:
+                        moved[unit_id] = [record[2], record[3]]
+                        self.__leave(unit_id, record[2], record[3])
+                        self.__place(unit_id, x, y)
+                        record[2] = x
+                        record[3] = y
+                    if record[4] != health:
+                        if health < record[4]:
+                            damaged[unit_id] = record[4]
+                        else:
+                            shielded[unit_id] = record[4]
+                        record[4] = health
+
+        died = {}
+        if len(seen) != len(units):
+            for unit_id in [unit_id for unit_id in units if unit_id not in seen]:
+                record = units.pop(unit_id)
+                self.__leave(unit_id, record[2], record[3])
+                died[unit_id] = record
+
+        self.spawned = spawned
+        self.moved = moved
+        self.damaged = damaged
+        self.shielded = shielded
+        self.died = died
+        return self
+
+    def __place(self, unit_id, x, y):
+        ids = self.__at.get((x, y))
+        if ids is None:
+            self.__at[(x, y)] = [unit_id]
+        else:
+            ids.append(unit_id)
+
+    def __leave(self, unit_id, x, y):
+        ids = self.__at[(x, y)]
+        ids.remove(unit_id)
+        if not ids:
+            del self.__at[(x, y)]
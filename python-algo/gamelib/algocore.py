@@ -1,7 +1,72 @@
 import json
+import re
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import get_command, debug_write, BANNER_TEXT, send_command, BackgroundReader
+from .time_budget import TurnBudget
+from .unit import load_unit_stats
+
+# Reads the message type, turnInfo[0], without decoding the rest of the message
+TURN_TYPE_PATTERN = re.compile(r'"turnInfo"\s*:\s*\[\s*(-?\d+)')
+
+
+def get_state_type(game_state_string):
+    """Gets turnInfo[0] of an engine message: 0 for a turn, 1 for an action frame and 2 for the end of the game
+
+    Args:
+        game_state_string: A message from the game engine that contains turnInfo
+
+    Returns:
+        The message type as an int
+
+    """
+    match = TURN_TYPE_PATTERN.search(game_state_string)
+    if match is None:
+        return int(json.loads(game_state_string).get("turnInfo")[0])
+    return int(match.group(1))
+
+
+_field_patterns = {}
+_decoder = json.JSONDecoder()
+
+
+def extract_fields(game_state_string, fields):
+    """Decodes only some of the keys of an engine message, skipping over everything else.
+    Works for the top level keys (turnInfo, p1Stats, p1Units, events, ...) and for the event
+    lists inside events (breach, damage, death, ...), since all of these names are distinct.
+
+    Args:
+        game_state_string: A message from the game engine
+        fields: The names of the keys to decode
+
+    Returns:
+        A dict with the decoded value of each field, None for fields not in the message
+
+    """
+    extracted = {}
+    for field in fields:
+        pattern = _field_patterns.get(field)
+        if pattern is None:
+            pattern = _field_patterns[field] = re.compile(r'"{}"\s*:\s*'.format(re.escape(field)))
+        match = pattern.search(game_state_string)
+        extracted[field] = None if match is None else _decoder.raw_decode(game_state_string, match.end())[0]
+    return extracted
+
+
+def decode_message(game_state_string):
+    """Decodes the config and the turnInfo messages of the game engine, used by the background reader
+    """
+    if "turnInfo" in game_state_string or "replaySave" in game_state_string:
+        return json.loads(game_state_string)
+    return None
+
+
+def pick_fields(game_state, fields):
+    """Same as extract_fields, for a message that was already decoded
+    """
+    events = game_state.get("events") or {}
+    return {field: game_state[field] if field in game_state else events.get(field) for field in fields}
+
 
 class AlgoCore(object):
     """
@@ -10,10 +75,31 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * budget (TurnBudget): The time left this turn. Pass it to GameState so slow functions stop in time.
+        * frame_events (list): The action frame events to subscribe to, such as ["breach", "death"].
+          If set, only these event lists are decoded, frames where they are all empty are skipped,
+          and frames go to on_frame_events instead of on_action_frame. None to get every frame whole.
+        * frame_fields (list): Other keys of the frame to decode along with frame_events, such as ["p1Units", "p2Units"].
+          Frames are never skipped when this is not empty.
+        * frame_summary (bool): If true, subscribed events are collected over the whole action phase and passed
+          to on_action_phase_summary once it ends, instead of calling on_frame_events for every frame.
+        * threaded_input (bool): If true, start() reads and decodes engine messages on a background thread.
+          Set it before calling start(). Action frames are only decoded there when they go to on_action_frame_parsed.
+        * parsed_state (dict): With threaded_input, the current message already decoded, None if it was not decoded.
+          Pass it to GameState as parsed_state so the turn state is not decoded twice.
 
     """
     def __init__(self):
         self.config = None
+        self.budget = TurnBudget()
+        self.frame_events = None
+        self.frame_fields = []
+        self.frame_summary = False
+        self.threaded_input = False
+        self.parsed_state = None
+        self.__summary = None
+        self.__summary_frames = 0
+        self.__decode_frames = False
 
     def on_game_start(self, config):
         """
@@ -43,6 +129,63 @@ class AlgoCore(object):
         """
         pass
 
+    def on_action_frame_parsed(self, action_frame, action_frame_game_state):
+        """
+        Same as on_action_frame, but also gets the frame already decoded from json, so it is only decoded once. \n
+        By default it passes the string on to on_action_frame. 
+        Override this one instead of on_action_frame to avoid decoding every frame yourself.
+        Frames are only decoded when this function is overridden.
+        """
+        self.on_action_frame(action_frame_game_state)
+
+    def on_frame_events(self, frame, action_frame_game_state):
+        """
+        Called for every action frame that has one of the events in frame_events, when frame_events is set. \n
+        frame holds 'turnInfo', each subscribed event list and each key of frame_fields, and nothing else.
+        """
+        pass
+
+    def on_action_phase_summary(self, summary, frame_count):
+        """
+        Called once an action phase is over when frame_summary is set, before on_turn of the next turn. \n
+        summary holds every subscribed event of the phase, in order, under the name of the event. 
+        The keys of frame_fields hold their value in the last frame of the phase.
+        """
+        pass
+
+    def __subscribed_frame(self, game_state_string, decoded=None):
+        """
+        Decodes only the subscribed parts of an action frame, then skips it, adds it to the summary or passes it on.
+        """
+        fields = ["turnInfo"] + list(self.frame_events) + list(self.frame_fields)
+        frame = extract_fields(game_state_string, fields) if decoded is None else pick_fields(decoded, fields)
+        if self.frame_summary:
+            if self.__summary is None:
+                self.__summary = {event: [] for event in self.frame_events}
+                self.__summary_frames = 0
+            for event in self.frame_events:
+                self.__summary[event].extend(frame[event] or [])
+            for field in self.frame_fields:
+                self.__summary[field] = frame[field]
+            self.__summary_frames += 1
+        elif self.frame_fields or any(frame[event] for event in self.frame_events):
+            self.on_frame_events(frame, game_state_string)
+
+    def __decode_message(self, game_state_string):
+        """
+        Used by the background reader. Action frames are only decoded when on_action_frame_parsed wants them whole,
+        subscribed frames are left to the field extractor of __subscribed_frame.
+        """
+        if "turnInfo" in game_state_string and get_state_type(game_state_string) == 1:
+            if self.frame_events is not None or not self.__decode_frames:
+                return None
+        return decode_message(game_state_string)
+
+    def __end_action_phase(self):
+        if self.__summary is not None:
+            summary, self.__summary = self.__summary, None
+            self.on_action_phase_summary(summary, self.__summary_frames)
+
 
     def start(self):
         """ 
@@ -52,20 +195,35 @@ class AlgoCore(object):
         The algo continues this loop until it receives the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        decode_frames = self.__decode_frames = type(self).on_action_frame_parsed is not AlgoCore.on_action_frame_parsed
+        reader = BackgroundReader(self.__decode_message) if self.threaded_input else None
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
-            game_state_string = get_command()
+            if reader is None:
+                game_state_string = get_command()
+                self.budget.start()
+            else:
+                read_at, game_state_string, self.parsed_state = reader.get_command()
+                self.budget.start(read_at)
+            decoded = self.parsed_state
             if "replaySave" in game_state_string:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                parsed_config = json.loads(game_state_string) if decoded is None else decoded
+                self.budget = TurnBudget.from_config(parsed_config)
+                load_unit_stats(parsed_config)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+                """
+                Only the message type is read here, unless the background reader already decoded the message.
+                The turn state is decoded once, by GameState.
+                """
+                stateType = get_state_type(game_state_string) if decoded is None else int(decoded["turnInfo"][0])
+                if stateType != 1:
+                    self.__end_action_phase()
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
@@ -76,7 +234,12 @@ class AlgoCore(object):
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    if self.frame_events is not None:
+                        self.__subscribed_frame(game_state_string, decoded)
+                    elif decode_frames:
+                        self.on_action_frame_parsed(json.loads(game_state_string) if decoded is None else decoded, game_state_string)
+                    else:
+                        self.on_action_frame(game_state_string)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
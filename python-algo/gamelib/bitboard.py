@@ -0,0 +1,76 @@
+"""
+Helpers for working with bitboards, Python ints where bit x * ARENA_SIZE + y
+stands for the location [x, y]. GameMap keeps one bitboard per player per
+unit type, and these helpers turn them into counts and locations.
+"""
+from .board_tables import ARENA_SIZE, HALF_ARENA
+
+
+def location_bit(location):
+    """The bitboard holding only the given location
+    """
+    return 1 << (location[0] * ARENA_SIZE + location[1])
+
+
+def mask_of(locations):
+    """Builds a bitboard from a list of locations
+    """
+    mask = 0
+    for x, y in locations:
+        mask |= 1 << (x * ARENA_SIZE + y)
+    return mask
+
+
+def locations_of(mask):
+    """Lists the locations set in a bitboard, in increasing index order
+    """
+    locations = []
+    while mask:
+        lowest = mask & -mask
+        locations.append(list(divmod(lowest.bit_length() - 1, ARENA_SIZE)))
+        mask ^= lowest
+    return locations
+
+
+def popcount(mask, region=None):
+    """Counts the locations set in a bitboard
+
+    Args:
+        mask: A bitboard
+        region: If given, only locations also set in this bitboard are counted
+
+    Returns:
+        The number of set locations
+
+    """
+    if region is not None:
+        mask &= region
+    return bin(mask).count("1")
+
+
+def region_mask(x_range=None, y_range=None):
+    """Builds a rectangular bitboard, clipped to the 28x28 grid rather than to the arena
+
+    Args:
+        x_range: An iterable of x coordinates, all columns if None
+        y_range: An iterable of y coordinates, all rows if None
+
+    Returns:
+        The bitboard holding every [x, y] with x in x_range and y in y_range
+
+    """
+    column = 0
+    for y in (range(ARENA_SIZE) if y_range is None else y_range):
+        if 0 <= y < ARENA_SIZE:
+            column |= 1 << y
+    mask = 0
+    for x in (range(ARENA_SIZE) if x_range is None else x_range):
+        if 0 <= x < ARENA_SIZE:
+            mask |= column << (x * ARENA_SIZE)
+    return mask
+
+
+BOTTOM_HALF = region_mask(y_range=range(HALF_ARENA))
+TOP_HALF = region_mask(y_range=range(HALF_ARENA, ARENA_SIZE))
+LEFT_HALF = region_mask(x_range=range(HALF_ARENA))
+RIGHT_HALF = region_mask(x_range=range(HALF_ARENA, ARENA_SIZE))
@@ -0,0 +1,136 @@
+"""
+Static lookup tables describing the board, built once when gamelib is imported.
+
+Locations are stored at index x * ARENA_SIZE + y in the flat tables. Range disks
+and the rings they are split into depend on the getHitRadius of the game config, so they are built the first time
+a radius is asked for and cached from then on.
+"""
+import math
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+GRID_CELLS = ARENA_SIZE * ARENA_SIZE
+
+
+def _in_bounds(x, y):
+    if y < HALF_ARENA:
+        return HALF_ARENA - 1 - y <= x <= HALF_ARENA + y
+    return y - HALF_ARENA <= x <= ARENA_SIZE + HALF_ARENA - 1 - y
+
+
+IN_BOUNDS = bytearray(1 if _in_bounds(x, y) else 0 for x in range(ARENA_SIZE) for y in range(ARENA_SIZE))
+IN_BOUNDS_INDICES = tuple(index for index in range(GRID_CELLS) if IN_BOUNDS[index])
+IN_BOUNDS_LOCATIONS = frozenset(divmod(index, ARENA_SIZE) for index in IN_BOUNDS_INDICES)
+
+
+def _build_neighbor_table():
+    """For every index, its four neighbors in the order up, down, right, left, with -1 outside of the arena
+    """
+    table = []
+    for x in range(ARENA_SIZE):
+        for y in range(ARENA_SIZE):
+            neighbors = []
+            for location in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                neighbors.append(location[0] * ARENA_SIZE + location[1] if location in IN_BOUNDS_LOCATIONS else -1)
+            table.append(tuple(neighbors))
+    return tuple(table)
+
+
+NEIGHBORS = _build_neighbor_table()
+
+# In the order of GameMap.TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT and BOTTOM_RIGHT
+EDGES = (
+    tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA)),
+)
+EDGE_SETS = tuple(frozenset(edge) for edge in EDGES)
+FRIENDLY_EDGES = EDGE_SETS[2] | EDGE_SETS[3]
+
+_range_disks = {}
+
+
+def range_offsets(radius, get_hit_radius):
+    """Gets the offsets of every location in range of a unit
+
+    A unit with a given range affects all locations whose centers are within that range + get hit radius.
+
+    Args:
+        radius: The range of the unit
+        get_hit_radius: The getHitRadius of the game config
+
+    Returns:
+        A tuple of (dx, dy) offsets, ordered by dx then dy
+
+    """
+    key = (radius, get_hit_radius)
+    offsets = _range_disks.get(key)
+    if offsets is None:
+        search_radius = math.ceil(radius)
+        offsets = tuple((dx, dy)
+                        for dx in range(-search_radius, search_radius + 1)
+                        for dy in range(-search_radius, search_radius + 1)
+                        if math.sqrt(dx ** 2 + dy ** 2) < radius + get_hit_radius)
+        _range_disks[key] = offsets
+    return offsets
+
+
+_attack_disks = {}
+
+
+def attack_offsets(attack_range):
+    """Gets the offsets of every location an attacker with the given range can hit,
+    using the same distance <= attackRange rule as GameState.get_attackers
+
+    Args:
+        attack_range: The attackRange of the unit
+
+    Returns:
+        A tuple of (dx, dy) offsets, ordered by dx then dy
+
+    """
+    offsets = _attack_disks.get(attack_range)
+    if offsets is None:
+        search_radius = math.ceil(attack_range)
+        offsets = tuple((dx, dy)
+                        for dx in range(-search_radius, search_radius + 1)
+                        for dy in range(-search_radius, search_radius + 1)
+                        if math.sqrt(dx ** 2 + dy ** 2) <= attack_range)
+        _attack_disks[attack_range] = offsets
+    return offsets
+
+
+_rings = {}
+
+
+def range_rings(x, y, radius, get_hit_radius):
+    """Groups the in bounds locations in range of a unit at [x, y] into rings of equal distance
+
+    Args:
+        x: The x coordinate of the unit
+        y: The y coordinate of the unit
+        radius: The range of the unit
+        get_hit_radius: The getHitRadius of the game config
+
+    Returns:
+        A tuple of (squared distance, bitboard, locations) rings, nearest first. The locations of a ring
+        are (x, y) tuples in the same order as range_offsets, and the bitboard holds the same locations.
+
+    """
+    key = (x, y, radius, get_hit_radius)
+    rings = _rings.get(key)
+    if rings is None:
+        grouped = {}
+        for dx, dy in range_offsets(radius, get_hit_radius):
+            if (x + dx, y + dy) in IN_BOUNDS_LOCATIONS:
+                grouped.setdefault(dx * dx + dy * dy, []).append((x + dx, y + dy))
+        rings = []
+        for distance in sorted(grouped):
+            mask = 0
+            for location in grouped[distance]:
+                mask |= 1 << (location[0] * ARENA_SIZE + location[1])
+            rings.append((distance, mask, tuple(grouped[distance])))
+        rings = tuple(rings)
+        _rings[key] = rings
+    return rings
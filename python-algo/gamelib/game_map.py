@@ -1,6 +1,79 @@
 import math
+import copy
 from .unit import GameUnit
+from .rules import load_rules
 from .util import debug_write
+from .bitboard import popcount
+from .board_tables import IN_BOUNDS_LOCATIONS, EDGES, range_offsets
+
+
+class _UnitList(list):
+    """
+    The list of units at a location of a GameMap. It tells the map whenever it is edited in place,
+    so the bitboards stay in sync with units appended to game_map[x, y] by hand.
+    """
+    __slots__ = ("_game_map", "_location")
+
+    def __init__(self, units=(), game_map=None, location=None):
+        super().__init__(units)
+        self._game_map = game_map
+        self._location = location
+
+    def __reduce_ex__(self, protocol):
+        # Pass the units to the constructor, so copying or unpickling does not call append on a half built map
+        return _UnitList, (list(self),), (self._game_map, self._location)
+
+    def __setstate__(self, state):
+        self._game_map, self._location = state
+
+    def __changed(self):
+        if self._game_map is not None:
+            self._game_map._on_location_changed(self._location)
+
+    def append(self, unit):
+        list.append(self, unit)
+        if self._game_map is not None:
+            self._game_map._on_unit_added(unit)
+
+    def extend(self, units):
+        super().extend(units)
+        self.__changed()
+
+    def insert(self, index, unit):
+        super().insert(index, unit)
+        self.__changed()
+
+    def remove(self, unit):
+        super().remove(unit)
+        self.__changed()
+
+    def pop(self, index=-1):
+        unit = super().pop(index)
+        self.__changed()
+        return unit
+
+    def clear(self):
+        super().clear()
+        self.__changed()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.__changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.__changed()
+
+    def __iadd__(self, units):
+        super().__iadd__(units)
+        self.__changed()
+        return self
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self.__changed()
+        return self
+
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -9,6 +82,11 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    Alongside the grid, the map keeps bitboards (see bitboard.py) of the locations holding
+    each player's units of each type, and of their upgraded units. They are kept in sync by add_unit,
+    remove_unit, assignments to game_map[x, y] and edits to the unit lists, such as
+    game_map[x, y].append(unit). Units changed in place, for example by calling upgrade on them, are not tracked.
+
     Attributes :
         * config (JSON): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
@@ -37,6 +115,21 @@ class GameMap:
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
         self.__start = [13,0]
+        rules = load_rules(config)
+        self.__type_index = rules.type_ids
+        self.__structure_types = [index for index, stationary in enumerate(rules.stationary) if stationary]
+        self.__mobile_types = [index for index, category in enumerate(rules.unit_category) if category == 1]
+        self.__boards = [[0] * len(rules.unit_types) for _ in range(2)]
+        self.__upgraded = [0, 0]
+        self.__blocked = 0
+        self.__get_hit_radius = rules.get_hit_radius
+        # Copy on write state, see fork
+        self.__shared_columns = 0
+        self.__shares_units = False
+        self.__owned_units = set()
+        # Undo log of the open transactions of GameState, None when there are none
+        self.__undo_log = None
+        self.__structure_listeners = []
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,7 +139,12 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            if self.__shared_columns >> location[0] & 1:
+                self.__unshare_column(location[0])
+            if self.__undo_log is not None:
+                self.__undo_log.append(("replace", location[0], location[1], self.__map[location[0]][location[1]]))
+            self.__map[location[0]][location[1]] = _UnitList(val, self, (location[0], location[1]))
+            self._on_location_changed(location)
             return
         self._invalid_coordinates(location)
 
@@ -71,8 +169,12 @@ class GameMap:
         grid = []
         for x in range(0, self.ARENA_SIZE):
             grid.append([])
-            for _ in range(0, self.ARENA_SIZE):
-                grid[x].append([])
+            for y in range(0, self.ARENA_SIZE):
+                # Skips _UnitList.__init__, since a map is built every turn
+                units = list.__new__(_UnitList)
+                units._game_map = self
+                units._location = (x, y)
+                grid[x].append(units)
         return grid
 
     def _invalid_coordinates(self, location):
@@ -89,19 +191,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return (x, y) in IN_BOUNDS_LOCATIONS
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +207,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [list(location) for location in EDGES[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -126,36 +215,18 @@ class GameMap:
         Returns:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
+            The lists are copied from board_tables.EDGES, so they can be modified freely.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[list(location) for location in edge] for edge in EDGES]
     
-    def add_unit(self, unit_type, location, player_index=0):
+    def add_unit(self, unit_type, location, player_index=0, num=1):
         """Add a single GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            num: The number of units to add. Only mobile units can share a location, a structure is always added alone.
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
@@ -168,10 +239,21 @@ class GameMap:
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        if self.__shared_columns >> x & 1:
+            self.__unshare_column(x)
+        if self.__shares_units:
+            self.__owned_units.add(id(new_unit))
         if not new_unit.stationary:
+            if self.__undo_log is not None:
+                self.__undo_log.append(("append", x, y, len(self.__map[x][y])))
             self.__map[x][y].append(new_unit)
+            for _ in range(num - 1):
+                self.__map[x][y].append(GameUnit(unit_type, self.config, player_index, None, x, y))
         else:
-            self.__map[x][y] = [new_unit]
+            if self.__undo_log is not None:
+                self.__undo_log.append(("replace", x, y, self.__map[x][y]))
+            self.__map[x][y] = _UnitList([new_unit], self, (x, y))
+            self._on_location_changed(location)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +268,282 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        if self.__shared_columns >> x & 1:
+            self.__unshare_column(x)
+        if self.__undo_log is not None:
+            self.__undo_log.append(("replace", x, y, self.__map[x][y]))
+        self.__map[x][y] = _UnitList((), self, (x, y))
+        self._on_location_changed(location)
+
+    def fork(self):
+        """Creates a copy of the map that can be changed without affecting this one, and the other way around
+
+        The copy is cheap: both maps share their columns of unit lists and their units until one of them
+        changes them. Reading game_map[x, y] copies nothing. A column is copied the first time add_unit,
+        remove_unit or an assignment to game_map[x, y] changes it, and a unit is copied before GameState
+        changes it, for example to upgrade it.
+
+        Unit lists and units edited in place, such as with game_map[x, y].append(unit) or by setting
+        pending_removal, are not copied first, so the edit may show up in both maps. Use add_unit,
+        remove_unit or assignments on maps that have been forked.
+
+        Returns:
+            A new GameMap with the same units and bitboards
+
+        """
+        child = GameMap.__new__(GameMap)
+        child.__dict__.update(self.__dict__)
+        child.__map = list(self.__map)
+        child.__start = [13,0]
+        child.__boards = [list(player_boards) for player_boards in self.__boards]
+        child.__upgraded = list(self.__upgraded)
+        child.__shared_columns = self.__shared_columns = (1 << self.ARENA_SIZE) - 1
+        child.__shares_units = self.__shares_units = True
+        child.__owned_units = set()
+        child.__undo_log = None
+        child.__structure_listeners = list(self.__structure_listeners)
+        self.__owned_units = set()
+        return child
+
+    def __unshare_column(self, x):
+        self.__map[x] = [_UnitList(units, self, (x, y)) for y, units in enumerate(self.__map[x])]
+        self.__shared_columns &= ~(1 << x)
+
+    def _unshared_unit(self, unit):
+        """
+        Used internally before changing a unit in place. If the unit may be shared with a fork of this map,
+        it is replaced on this map by a copy, and the copy is returned.
+        """
+        if not self.__shares_units or id(unit) in self.__owned_units:
+            return unit
+        if self.__shared_columns >> unit.x & 1:
+            self.__unshare_column(unit.x)
+        units = self.__map[unit.x][unit.y]
+        for index, other in enumerate(units):
+            if other is unit:
+                unit = units[index] = copy.copy(unit)
+                self.__owned_units.add(id(unit))
+                break
+        return unit
+
+    def layout_key(self):
+        """Gets a key identifying which locations hold structures
+
+        Two maps with the same structure locations have the same key, so it can be used to cache
+        anything that only depends on where structures are, such as paths.
+
+        Returns:
+            The blocked_mask of the map
+
+        """
+        return self.__blocked
+
+    def blocked_mask(self):
+        """Gets the locations units cannot path through
+
+        Returns:
+            A bitboard of every location holding a structure of either player
+
+        """
+        return self.__blocked
+
+    def structures_of(self, player_index, unit_type=None):
+        """Gets the locations of a player's structures
+
+        Args:
+            player_index: The index corresponding to the player, 0 for you 1 for the enemy
+            unit_type: The type of structure, or None for every structure type
+
+        Returns:
+            A bitboard of the matching locations
+
+        """
+        if unit_type is not None:
+            return self.units_of(player_index, unit_type)
+        boards = self.__boards[player_index]
+        mask = 0
+        for type_index in self.__structure_types:
+            mask |= boards[type_index]
+        return mask
+
+    def mobile_units_of(self, player_index):
+        """Gets the locations holding at least one of a player's mobile units
+
+        Args:
+            player_index: The index corresponding to the player, 0 for you 1 for the enemy
+
+        Returns:
+            A bitboard of the matching locations
+
+        """
+        boards = self.__boards[player_index]
+        mask = 0
+        for type_index in self.__mobile_types:
+            mask |= boards[type_index]
+        return mask
+
+    def units_of(self, player_index, unit_type):
+        """Gets the locations holding at least one of a player's units of the given type
+
+        Args:
+            player_index: The index corresponding to the player, 0 for you 1 for the enemy
+            unit_type: The unit type, structure or mobile
+
+        Returns:
+            A bitboard of the matching locations
+
+        """
+        return self.__boards[player_index][self.__type_index[unit_type]]
+
+    def upgraded_mask(self, player_index=None):
+        """Gets the locations holding upgraded units
+
+        Args:
+            player_index: The index corresponding to the player, or None for both players
+
+        Returns:
+            A bitboard of the matching locations
+
+        """
+        if player_index is None:
+            return self.__upgraded[0] | self.__upgraded[1]
+        return self.__upgraded[player_index]
+
+    def count_structures(self, player_index, unit_type=None, region=None):
+        """Counts a player's structures
+
+        Args:
+            player_index: The index corresponding to the player, 0 for you 1 for the enemy
+            unit_type: The type of structure, or None for every structure type
+            region: A bitboard limiting the count to some locations, such as bitboard.LEFT_HALF
+
+        Returns:
+            The number of matching structures
+
+        """
+        return popcount(self.structures_of(player_index, unit_type), region)
+
+    def _upgrade_unit(self, unit):
+        """
+        Used internally by GameState to upgrade a unit on the map, keeping the bitboards,
+        forks and undo log in sync. Returns the unit that was upgraded, which may be a copy.
+        """
+        unit = self._unshared_unit(unit)
+        if self.__undo_log is not None:
+            self.__undo_log.append(("stats", unit, unit.stats))
+        unit.upgrade()
+        self._on_unit_upgraded(unit)
+        return unit
+
+    def _begin(self):
+        """
+        Used internally by GameState.begin. Starts logging changes if needed and returns the position to roll back to.
+        """
+        if self.__undo_log is None:
+            self.__undo_log = []
+        return len(self.__undo_log)
+
+    def _rollback(self, position):
+        """
+        Used internally by GameState.rollback to undo every change logged after a position, newest first.
+        """
+        log = self.__undo_log
+        while log is not None and len(log) > position:
+            change = log.pop()
+            if change[0] == "stats":
+                # The unit may be shared with a fork made since it was changed
+                unit = self._unshared_unit(change[1])
+                unit.stats = change[2]
+                self._on_location_changed([unit.x, unit.y])
+                continue
+            kind, x, y, value = change
+            if self.__shared_columns >> x & 1:
+                self.__unshare_column(x)
+            if kind == "append":
+                del self.__map[x][y][value:]
+            else:
+                # A copy, since the old list may have been shared with a fork since it was replaced
+                self.__map[x][y] = _UnitList(value, self, (x, y))
+                self._on_location_changed([x, y])
+
+    def _end_log(self):
+        """
+        Used internally by GameState once the outermost transaction is over
+        """
+        self.__undo_log = None
+
+    def add_structure_listener(self, listener):
+        """Registers an object to be told when a location starts or stops holding a structure.
+        Its on_structure_added(location) and on_structure_removed(location) are called with the [x, y]
+        of the location, as add_unit, remove_unit, assignments to game_map[x, y] and rollbacks change it.
+        GameState registers its path finder this way.
+
+        Args:
+            listener: An object with on_structure_added and on_structure_removed methods
+
+        """
+        if listener not in self.__structure_listeners:
+            self.__structure_listeners.append(listener)
+
+    def remove_structure_listener(self, listener):
+        """Stops telling a listener registered with add_structure_listener about structure changes
+        """
+        if listener in self.__structure_listeners:
+            self.__structure_listeners.remove(listener)
+
+    def _on_unit_added(self, unit):
+        """
+        Used internally to keep the bitboards in sync when a unit is placed on the map
+        """
+        if self.__add_to_boards(unit):
+            for listener in self.__structure_listeners:
+                listener.on_structure_added([unit.x, unit.y])
+
+    def __add_to_boards(self, unit):
+        """
+        Sets the bits of a unit in the bitboards, returning True if its location was not blocked before
+        """
+        if not self.in_arena_bounds([unit.x, unit.y]) or unit.player_index not in (0, 1):
+            return False
+        bit = 1 << (unit.x * self.ARENA_SIZE + unit.y)
+        self.__boards[unit.player_index][self.__type_index[unit.unit_type]] |= bit
+        if unit.upgraded:
+            self.__upgraded[unit.player_index] |= bit
+        if unit.stationary and not self.__blocked & bit:
+            self.__blocked |= bit
+            return True
+        return False
+
+    def _on_unit_upgraded(self, unit):
+        """
+        Used internally to keep the bitboards in sync when a unit on the map is upgraded
+        """
+        if self.in_arena_bounds([unit.x, unit.y]) and unit.player_index in (0, 1):
+            self.__upgraded[unit.player_index] |= 1 << (unit.x * self.ARENA_SIZE + unit.y)
+
+    def _on_location_changed(self, location):
+        """
+        Used internally to rebuild the bitboards of a location whose units were replaced
+        """
+        if not self.in_arena_bounds(location):
+            return
+        x, y = location
+        bit = 1 << (x * self.ARENA_SIZE + y)
+        was_blocked = self.__blocked & bit
+        for player_boards in self.__boards:
+            for type_index in range(len(player_boards)):
+                player_boards[type_index] &= ~bit
+        self.__upgraded[0] &= ~bit
+        self.__upgraded[1] &= ~bit
+        self.__blocked &= ~bit
+        for unit in self.__map[x][y]:
+            self.__add_to_boards(unit)
+        if was_blocked != self.__blocked & bit:
+            for listener in self.__structure_listeners:
+                if was_blocked:
+                    listener.on_structure_removed([x, y])
+                else:
+                    listener.on_structure_added([x, y])
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -206,14 +563,10 @@ class GameMap:
 
         x, y = location
         locations = []
-        search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
-        for i in range(int(x - search_radius), int(x + search_radius + 1)):
-            for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = [i, j]
-                # A unit with a given range affects all locations whose centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
+        # A unit with a given range affects all locations whose centers are within that range + get hit radius
+        for dx, dy in range_offsets(radius, self.__get_hit_radius):
+            if (x + dx, y + dy) in IN_BOUNDS_LOCATIONS:
+                locations.append([x + dx, y + dy])
         return locations
 
     def distance_between_locations(self, location_1, location_2):
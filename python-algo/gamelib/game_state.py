@@ -1,11 +1,17 @@
 import math
 import json
-import sys
+import re
+from collections import namedtuple
 
-from .navigation import ShortestPathFinder
+from .navigation import GridPathFinder, PathCache
 from .util import send_command, debug_write
 from .unit import GameUnit
 from .game_map import GameMap
+from .board_tables import FRIENDLY_EDGES, range_rings
+from .bitboard import locations_of
+from .threat_map import ThreatMap
+from .unit_table import UnitTable
+from .rules import load_rules
 
 def is_stationary(unit_type):
     """
@@ -17,6 +23,13 @@ def is_stationary(unit_type):
     """
     return unit_type in STRUCTURE_TYPES
 
+
+BlockingTile = namedtuple("BlockingTile", ["location", "paths", "damage", "steps", "breaches"])
+BlockingTile.__doc__ = """The effect of a wall on the enemy's paths, as reported by GameState.rank_blocking_tiles.
+paths holds the path from each start location with the wall in place, damage is the damage your units deal
+along all of them (see ThreatMap.path_damage), steps is their total length and breaches is how many of them still
+reach your edge."""
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
@@ -44,20 +57,31 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * path_cache (:obj: PathCache): Paths already computed by find_path_to_edge, keyed by structure layout.
+          Assign the same PathCache to the GameState of every turn to reuse paths across turns.
+        * path_table (:obj: PathTable): Paths precomputed offline for common layouts, looked up before searching. None by default.
+        * budget (:obj: TurnBudget): The time budget of this turn, or None. Slow functions return early when it runs out.
+        * rules (:obj: RulesTable): The costs, ranges and other stats of every unit type, compiled from the config
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, budget=None, lazy=False, parsed_state=None):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
             * serialized_string (string): A string containing information about the game state at the start of this turn
+            * budget (TurnBudget): The time budget of this turn, usually AlgoCore.budget
+            * lazy (bool): If true, only the turn number, health, time and resources are read now.
+              The units are decoded and the game_map is built the first time game_map is used.
+            * parsed_state (dict): serialized_string already decoded from json, if you have it, so it is not decoded again
 
         """
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
+        self.budget = budget
+        self.rules = load_rules(config)
 
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
         UNIT_TYPE_TO_INDEX = {}
@@ -89,22 +113,105 @@ class GameState:
         MP = self.MP
         SP = self.SP
 
-        self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
+        self._shortest_path_finder = GridPathFinder()
+        self.path_cache = PathCache()
+        self.path_table = None
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        self.__state = parsed_state
+        self.__unit_table = None
+        self.__savepoints = []
+        if lazy:
+            self.__parse_scalars(serialized_string)
+        else:
+            self.game_map = GameMap(self.config)
+            self.__parse_state(serialized_string)
+            self.__listen_to_map()
+
+    def __getattr__(self, name):
+        """Builds the game_map of a lazily parsed state the first time it is used.
+        Once built it is a plain attribute, so later accesses do not come through here.
+        """
+        if name != "game_map":
+            raise AttributeError(name)
+        self.game_map = GameMap(self.config)
+        self.__create_parsed_units(self.raw_units(0), 0)
+        self.__create_parsed_units(self.raw_units(1), 1)
+        self.__listen_to_map()
+        return self.game_map
+
+    def __parse_scalars(self, state_line):
+        """
+        Reads the turnInfo and player stats without decoding the unit lists, which make up most of the string.
+        Falls back to decoding everything if the fields cannot be found.
+        """
+        if self.__state is not None:
+            self.__parse_stats(self.__state)
+            return
+        fields = {}
+        for key in ("turnInfo", "p1Stats", "p2Stats"):
+            match = re.search(r'"{}"\s*:\s*(\[[^\]]*\])'.format(key), state_line)
+            if match is None:
+                self.__parse_stats(self.__decoded())
+                return
+            fields[key] = json.loads(match.group(1))
+        self.__parse_stats(fields)
+
+    def __decoded(self):
+        if self.__state is None:
+            self.__state = json.loads(self.serialized_string)
+        return self.__state
+
+    def raw_units(self, player_index):
+        """Gets a player's units exactly as the game engine sent them, without creating any GameUnits.
+        Changes made this turn with attempt_spawn or the game_map are not included.
+
+        Args:
+            player_index: The index corresponding to the player whose units you want, 0 for you 1 for the enemy
+
+        Returns:
+            A list with one list per unit type, in the order of config["unitInformation"]. Each unit is [x, y, health, unit id].
+            The last two lists hold the locations being removed and upgraded.
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        return self.__decoded()["p1Units" if player_index == 0 else "p2Units"]
+
+    def unit_table(self):
+        """Gets the units of both players as a UnitTable, built from the raw units the first time it is asked for.
+        Like raw_units, changes made this turn are not included.
+
+        Returns:
+            A UnitTable
+
+        """
+        if self.__unit_table is None:
+            self.__unit_table = UnitTable(self.config, self.raw_units(0), self.raw_units(1))
+        return self.__unit_table
 
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
         state_line is the game state as a json string.
         """
-        state = json.loads(state_line)
+        state = self.__decoded()
+        self.__parse_stats(state)
 
+        p1units = state["p1Units"]
+        p2units = state["p2Units"]
+
+        self.__create_parsed_units(p1units, 0)
+        self.__create_parsed_units(p2units, 1)
+
+    def __parse_stats(self, state):
+        """
+        Helper function for __parse_state to read the turn number and the stats of both players.
+        """
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
 
@@ -120,20 +227,13 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
-
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
-
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
         """
-        typedef = self.config.get("unitInformation")
         for i, unit_types in enumerate(units):
+            unit_type = self.rules.unit_types[i]
             for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
                 sx, sy, shp = uinfo[:3]
                 x, y = map(int, [sx, sy])
                 hp = float(shp)
@@ -145,6 +245,7 @@ class GameState:
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].upgrade()
+                        self.game_map._on_unit_upgraded(self.game_map[x,y][0])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
                     self.game_map[x,y].append(unit)
@@ -176,10 +277,23 @@ class GameState:
             Must be called at the end of your turn or the algo will hang.
         """
         build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
+        deploy_string = json.dumps(self.__expanded_deploys())
         send_command(build_string)
         send_command(deploy_string)
 
+    def __expanded_deploys(self):
+        """
+        Expands the counted (unit_type, x, y, num) entries that bulk attempt_spawn calls put on the deploy stack
+        into one (unit_type, x, y) entry per unit, as the game engine expects
+        """
+        deploys = []
+        for entry in self._deploy_stack:
+            if len(entry) == 4:
+                deploys.extend([entry[:3]] * entry[3])
+            else:
+                deploys.append(entry)
+        return deploys
+
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
 
@@ -238,7 +352,7 @@ class GameState:
             self._invalid_unit(unit_type)
             return
 
-        costs = self.type_cost(unit_type)
+        costs = self.rules.cost[UNIT_TYPE_TO_INDEX[unit_type]]
         player_held = self.get_resources()
         if costs[MP] > 0 and costs[SP] > 0:
             return min(math.floor(player_held[SP] / costs[SP]), math.floor(player_held[MP] / costs[MP]))
@@ -295,13 +409,10 @@ class GameState:
         if unit_type == REMOVE:
             self._invalid_unit(unit_type)
             return
-        
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
-        if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
 
-        return cost_base
+        if upgrade:
+            return list(self.rules.upgrade_cost[UNIT_TYPE_TO_INDEX[unit_type]])
+        return list(self.rules.cost[UNIT_TYPE_TO_INDEX[unit_type]])
 
 
     def can_spawn(self, unit_type, location, num=1):
@@ -333,7 +444,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = (location[0], location[1]) in FRIENDLY_EDGES
 
         if self.enable_warnings:
             fail_reason = ""
@@ -360,6 +471,10 @@ class GameState:
             locations: A single location or list of locations to spawn units at
             num: The number of units of unit_type to deploy at the given location(s)
 
+        Mobile units are validated and paid for once per location rather than once per unit,
+        and several units at one location take a single counted (unit_type, x, y, num) entry
+        on the deploy stack, which submit_turn expands.
+
         Returns:
             The number of units successfully spawned
 
@@ -375,10 +490,13 @@ class GameState:
             locations = [locations]
         spawned_units = 0
         for location in locations:
+            if not is_stationary(unit_type):
+                spawned_units += self.__spawn_mobile(unit_type, location, num)
+                continue
             for i in range(num):
                 if self.can_spawn(unit_type, location, 1):
                     x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
+                    costs = self.rules.cost[UNIT_TYPE_TO_INDEX[unit_type]]
                     self.__set_resource(SP, 0 - costs[SP])
                     self.__set_resource(MP, 0 - costs[MP])
                     self.game_map.add_unit(unit_type, location, 0)
@@ -391,6 +509,24 @@ class GameState:
                     break
         return spawned_units
 
+    def __spawn_mobile(self, unit_type, location, num):
+        """
+        Helper function for attempt_spawn, spawns as many of num mobile units at one location as we can afford
+        """
+        if not self.can_spawn(unit_type, location, 1):
+            return 0
+        count = min(num, self.number_affordable(unit_type))
+        x, y = map(int, location)
+        costs = self.rules.cost[UNIT_TYPE_TO_INDEX[unit_type]]
+        self.__set_resource(SP, 0 - costs[SP] * count)
+        self.__set_resource(MP, 0 - costs[MP] * count)
+        self.game_map.add_unit(unit_type, location, 0, count)
+        self._deploy_stack.append((unit_type, x, y) if count == 1 else (unit_type, x, y, count))
+        if count < num:
+            # Gives the same warning as trying to spawn one unit too many
+            self.can_spawn(unit_type, location, 1)
+        return count
+
     def attempt_remove(self, locations):
         """Attempts to remove existing friendly structures in the given locations.
 
@@ -439,19 +575,82 @@ class GameState:
                     if unit.stationary:
                         existing_unit = unit
 
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
-                    costs = self.type_cost(existing_unit.unit_type, True)
+                type_id = UNIT_TYPE_TO_INDEX[existing_unit.unit_type]
+                if not existing_unit.upgraded and self.rules.upgradable[type_id]:
+                    costs = self.rules.upgrade_cost[type_id]
                     resources = self.get_resources()
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map._upgrade_unit(existing_unit)
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
                 self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
         return spawned_units
 
+    def fork(self):
+        """Creates a copy of this game state to try out moves on
+
+        The copy shares its map with this state copy on write (see GameMap.fork), and gets
+        its own resources and build and deploy stacks, so attempt_spawn, attempt_upgrade and
+        attempt_remove on either state do not affect the other. Forking is cheap enough to
+        do many times per turn, for example to search over build orders.
+        The path cache, path finder and time budget are shared.
+
+        Returns:
+            A new GameState
+
+        """
+        child = GameState.__new__(GameState)
+        child.__dict__.update(self.__dict__)
+        child.game_map = self.game_map.fork()
+        child._build_stack = list(self._build_stack)
+        child._deploy_stack = list(self._deploy_stack)
+        child._player_resources = [dict(resources) for resources in self._player_resources]
+        child.__savepoints = []
+        return child
+
+    def begin(self):
+        """Starts a transaction. Until it is committed or rolled back, every change made by attempt_spawn,
+        attempt_upgrade, attempt_remove and the add_unit, remove_unit and assignments of game_map is logged,
+        so rollback() can undo them in time proportional to the number of changes.
+        Transactions can be nested, rollback() and commit() apply to the innermost one.
+
+            game_state.begin()
+            game_state.attempt_spawn(WALL, locations)
+            damage = score(game_state)
+            game_state.rollback()
+
+        """
+        self.__savepoints.append((self.game_map._begin(), len(self._build_stack), len(self._deploy_stack),
+                                  [dict(resources) for resources in self._player_resources]))
+
+    def rollback(self):
+        """Undoes every change made since the innermost call to begin() and ends that transaction
+        """
+        if not self.__savepoints:
+            self.warn("Called rollback without calling begin first")
+            return
+        position, builds, deploys, resources = self.__savepoints.pop()
+        self.game_map._rollback(position)
+        del self._build_stack[builds:]
+        del self._deploy_stack[deploys:]
+        self._player_resources = resources
+        if not self.__savepoints:
+            self.game_map._end_log()
+
+    def commit(self):
+        """Keeps the changes made since the innermost call to begin() and ends that transaction.
+        The changes can still be undone by rolling back an enclosing transaction.
+        """
+        if not self.__savepoints:
+            self.warn("Called commit without calling begin first")
+            return
+        self.__savepoints.pop()
+        if not self.__savepoints:
+            self.game_map._end_log()
+
     def get_target_edge(self, start_location):
         """Gets the target edge given a starting location
 
@@ -495,8 +694,91 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        key = self.path_cache.key(self.game_map, start_location, target_edge)
+        path = self.path_cache.get(key, start_location)
+        if path is None:
+            path = self.__table_path(key, start_location, target_edge)
+        if path is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+            self.path_cache.put(key, path)
+        return path
+
+    def find_paths_to_edge_batch(self, start_locations, target_edge=None):
+        """Gets the paths units at many locations would take, in a single pass.
+        Equivalent to calling find_path_to_edge on each location, but the board is only scanned once
+        and the search towards each target edge is shared by all of the locations.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each start_location if None.
+
+        Returns:
+            A list containing the path for each start location, in order, or None for locations that are blocked.
+            If the budget runs out, the locations not reached yet also get None.
+
+        """
+        paths = []
+        queries = []
+        missing = []
+        for start_location in start_locations:
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                paths.append(None)
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            key = self.path_cache.key(self.game_map, start_location, edge)
+            paths.append(self.path_cache.get(key, start_location))
+            if paths[-1] is None:
+                paths[-1] = self.__table_path(key, start_location, edge)
+            if paths[-1] is None:
+                queries.append((start_location, self.game_map.get_edge_locations(edge)))
+                missing.append((len(paths) - 1, key))
+
+        if not queries:
+            return paths
+        if hasattr(self._shortest_path_finder, "navigate_batch"):
+            found = self._shortest_path_finder.navigate_batch(queries, self)
+        else:
+            found = [self._shortest_path_finder.navigate_multiple_endpoints(start, end_points, self) for start, end_points in queries]
+        for (index, key), path in zip(missing, found):
+            paths[index] = path
+            if path is not None:
+                self.path_cache.put(key, path)
+        return paths
+
+    def __table_path(self, key, start_location, target_edge):
+        """
+        Helper function for find_path_to_edge and find_paths_to_edge_batch, looks a path up in the path table
+        and adds it to the path cache under the given key
+        """
+        if self.path_table is None:
+            return None
+        path = self.path_table.get(self.game_map.layout_key(), start_location, target_edge)
+        if path is not None:
+            self.path_cache.put(key, path)
+        return path
+
+    def set_path_finder(self, path_finder):
+        """Selects the path-finding engine used by find_path_to_edge
+
+        Args:
+            path_finder: A path finder exposing navigate_multiple_endpoints, such as navigation.GridPathFinder (the default)
+                or the original Node based navigation.ShortestPathFinder
+
+        """
+        if "game_map" in self.__dict__:
+            self.game_map.remove_structure_listener(self._shortest_path_finder)
+        self._shortest_path_finder = path_finder
+        if "game_map" in self.__dict__:
+            self.__listen_to_map()
+
+    def __listen_to_map(self):
+        """
+        Registers the path finder with the game map, if it can repair its searches as structures change
+        """
+        if hasattr(self._shortest_path_finder, "on_structure_added"):
+            self.game_map.add_structure_listener(self._shortest_path_finder)
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -512,6 +794,8 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if not self.game_map.blocked_mask() >> (x * self.ARENA_SIZE + y) & 1:
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
@@ -542,6 +826,9 @@ class GameState:
         Their targeting priority is as follows:
             Infantry > Nearest Unit > Lowest Health > Lowest Y position > Closest to edge (Highest distance of X from the boards center, 13.5)
 
+        The locations in range are searched in rings of equal distance, nearest first, and only the
+        locations the bitboards of game_map show holding an enemy unit are looked at.
+
         Args:
             attacking_unit: A GameUnit
 
@@ -554,65 +841,119 @@ class GameState:
             self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
             return
 
-        attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
-        target = None
-        target_stationary = True
-        target_distance = sys.maxsize
-        target_health = sys.maxsize
-        target_y = self.ARENA_SIZE
-        target_x_distance = 0
-
-        for location in possible_locations:
-            for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
-                    continue
+        return self.__find_target(attacking_unit, {})
 
-                new_target = False
-                unit_stationary = unit.stationary
-                unit_distance = self.game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
-                unit_health = unit.health
-                unit_y = unit.y
-                unit_x_distance = abs(self.HALF_ARENA - 0.5 - unit.x)
+    def get_targets(self, attackers):
+        """Returns the target of each of many units, as get_target would choose it,
+        sharing the work between them. Use it to predict a whole frame of attacks at once.
 
-                if target_stationary and not unit_stationary:
-                    new_target = True
-                elif not target_stationary and unit_stationary:
-                    continue
-                
-                if target_distance > unit_distance:
-                    new_target = True
-                elif target_distance < unit_distance and not new_target:
-                    continue
+        Args:
+            attackers: A list of GameUnits
 
-                if target_health > unit_health:
-                    new_target = True
-                elif target_health < unit_health and not new_target:
-                    continue
+        Returns:
+            A list with the GameUnit each attacker would choose to attack, None where it has no target
 
-                # Compare height heuristic relative to attacking unit's player index
-                if attacking_unit.player_index == 0:
-                    if target_y > unit_y:
-                        new_target = True
-                    elif target_y < unit_y and not new_target:
-                        continue
-                else:
-                    if target_y < unit_y:
-                        new_target = True
-                    elif target_y > unit_y and not new_target:
-                        continue
+        """
+        targets = []
+        shared = {}
+        chosen = {}
+        for attacking_unit in attackers:
+            if not isinstance(attacking_unit, GameUnit):
+                self.warn("Passed a {} to get_targets as an attacker. Expected a GameUnit.".format(type(attacking_unit)))
+                targets.append(None)
+                continue
+            # Units at the same location with the same range and damage types always pick the same target
+            key = (attacking_unit.x, attacking_unit.y, attacking_unit.player_index, attacking_unit.attackRange,
+                   attacking_unit.damage_f > 0, attacking_unit.damage_i > 0)
+            if key not in chosen:
+                chosen[key] = self.__find_target(attacking_unit, shared)
+            targets.append(chosen[key])
+        return targets
+
+    def resolve_all_targets(self, player_index):
+        """Finds the target of every unit of a player that can attack, see get_targets
+
+        Args:
+            player_index: The index corresponding to the attacking player, 0 for you 1 for the enemy
+
+        Returns:
+            A list of (attacker, target) tuples, one for every attacker in the order of the map,
+            where target is None if the attacker has nothing in range
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
 
-                if target_x_distance < unit_x_distance:
-                    new_target = True
-                
-                if new_target:
-                    target = unit
-                    target_stationary = unit_stationary
-                    target_distance = unit_distance
-                    target_health = unit_health
-                    target_y = unit_y
-                    target_x_distance = unit_x_distance
-        return target
+        occupied = self.game_map.structures_of(player_index) | self.game_map.mobile_units_of(player_index)
+        attackers = []
+        for location in locations_of(occupied):
+            for unit in self.game_map[location]:
+                if unit.player_index == player_index and unit.damage_i + unit.damage_f > 0:
+                    attackers.append(unit)
+        return list(zip(attackers, self.get_targets(attackers)))
+
+    def __find_target(self, attacking_unit, shared):
+        """
+        Helper function for get_target and get_targets. shared holds, per attacking player, the bitboards
+        of the units they can target and the unit each location would offer first, so attackers of
+        the same player looking at the same locations only sort their units once.
+        """
+        attacker_location = [attacking_unit.x, attacking_unit.y]
+        if not self.game_map.in_arena_bounds(attacker_location):
+            self.game_map._invalid_coordinates(attacker_location)
+        game_map = self.game_map
+        player_index = attacking_unit.player_index
+        if player_index not in shared:
+            defenders = (1 - player_index,) if player_index in (0, 1) else (0, 1)
+            candidates = [0, 0]
+            for defender in defenders:
+                candidates[False] |= game_map.mobile_units_of(defender)
+                candidates[True] |= game_map.structures_of(defender)
+            shared[player_index] = (candidates, {})
+        candidates, best_in_location = shared[player_index]
+        rings = range_rings(attacking_unit.x, attacking_unit.y, attacking_unit.attackRange, self.rules.get_hit_radius)
+
+        # Mobile units are always chosen over structures, and within each group the nearest ring
+        # holding a candidate wins, so the rings are searched nearest first and the search stops there
+        for stationary, damage in ((False, attacking_unit.damage_i), (True, attacking_unit.damage_f)):
+            mask = candidates[stationary]
+            if damage == 0 or not mask:
+                continue
+            for _, ring_mask, ring in rings:
+                if not ring_mask & mask:
+                    continue
+                target = None
+                target_key = None
+                for x, y in ring:
+                    index = x * self.ARENA_SIZE + y
+                    if not mask >> index & 1:
+                        continue
+                    best = best_in_location.get((index, stationary))
+                    if best is None:
+                        best = self.__best_in_location(x, y, player_index, stationary)
+                        best_in_location[(index, stationary)] = best
+                    if best[0] is not None and (target is None or best[1] < target_key):
+                        target, target_key = best
+                if target is not None:
+                    return target
+        return None
+
+    def __best_in_location(self, x, y, player_index, stationary):
+        """
+        Helper function for __find_target. Returns the (unit, key) a unit of the given player would
+        target first among the units at one location, where smaller keys are preferred.
+        """
+        best = None
+        best_key = None
+        for unit in self.game_map[x, y]:
+            if unit.player_index == player_index or unit.stationary != stationary:
+                continue
+            # Lowest health, then lowest y for player 0 or highest y for player 1, then furthest from the center
+            key = (unit.health, unit.y if player_index == 0 else -unit.y, -abs(self.HALF_ARENA - 0.5 - unit.x))
+            if best is None or key < best_key:
+                best, best_key = unit, key
+        return best, best_key
 
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
@@ -632,16 +973,89 @@ class GameState:
             self.warn("Location {} is not in the arena bounds.".format(location))
 
         attackers = []
-        """
-        Get locations in the range of TURRET units
-        """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations= self.game_map.get_locations_in_range(location, self.rules.max_attack_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
                     attackers.append(unit)
         return attackers
+
+    def threat_map(self, player_index):
+        """Computes the damage every location of the board would take from the opposing player in one pass.
+        Upgrades and attack ranges are taken into account, and the attacker counts match get_attackers.
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatMap. Use threat_map.path_damage(path) to estimate the damage taken along a path.
+            If the budget runs out, threat_map.complete is False and only some attackers were added.
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+
+        threat = ThreatMap(player_index)
+        occupied = 0
+        for unit_type in ALL_UNITS:
+            occupied |= self.game_map.units_of(1 - player_index, unit_type)
+        for location in locations_of(occupied):
+            if self.budget is not None and self.budget.expired():
+                threat.complete = False
+                break
+            for unit in self.game_map[location]:
+                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index:
+                    threat.add_attacker(unit)
+        return threat
+
+    def rank_blocking_tiles(self, start_locations, candidates=None):
+        """Tries a wall on each candidate tile and ranks the tiles by how much they hurt the enemy's attack
+
+        For each tile, the enemy's paths from the start locations are found with a wall there, and scored with the
+        damage your units deal along them. The path finder repairs its distance fields around the one tile that
+        changed instead of searching the whole board again, so every free tile on your side can be tried in one turn.
+
+            ranked = game_state.rank_blocking_tiles([[13, 27], [14, 27]])
+            game_state.attempt_spawn(WALL, ranked[0].location)
+
+        Args:
+            start_locations: A single location or list of locations where enemy mobile units would spawn
+            candidates: The locations to try, every empty location on your side of the board if None.
+                Locations holding units and the start locations are skipped.
+
+        Returns:
+            A list of BlockingTile, most damage first and then longest paths first. If the budget runs out,
+            only the tiles tried so far are included.
+
+        """
+        if type(start_locations[0]) == int:
+            start_locations = [start_locations]
+        queries = []
+        for start_location in start_locations:
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            queries.append((start_location, self.game_map.get_edge_locations(self.get_target_edge(start_location))))
+        if candidates is None:
+            candidates = [location for location in self.game_map if location[1] < self.HALF_ARENA and not self.game_map[location]]
+
+        starts = {(start_location[0], start_location[1]) for start_location in start_locations}
+
+        threat = self.threat_map(1)
+        finder = self._shortest_path_finder
+        ranked = []
+        for location in candidates:
+            if self.budget is not None and self.budget.expired():
+                break
+            if not self.game_map.in_arena_bounds(location) or self.game_map[location] or (location[0], location[1]) in starts:
+                continue
+            self.begin()
+            self.game_map.add_unit(WALL, location, 0)
+            paths = [finder.navigate_multiple_endpoints(start, end_points, self) for start, end_points in queries]
+            self.rollback()
+            ranked.append(BlockingTile(list(location), paths, sum(threat.path_damage(path) for path in paths),
+                                       sum(len(path) - 1 for path in paths),
+                                       sum(1 for path, (_, end_points) in zip(paths, queries) if path[-1] in end_points)))
+        ranked.sort(key=lambda tile: (-tile.damage, -tile.steps))
+        return ranked
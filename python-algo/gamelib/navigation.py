@@ -2,7 +2,10 @@ import heapq
 import math
 import sys
 import queue
+from collections import OrderedDict
 from .util import debug_write
+from .board_tables import ARENA_SIZE, HALF_ARENA, GRID_CELLS, IN_BOUNDS_INDICES, NEIGHBORS
+from .bitboard import popcount
 
 class Node:
     """A path-finding node
@@ -314,3 +317,521 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class GridPathFinder:
+    """Array-backed replacement for ShortestPathFinder
+
+    Follows exactly the same rules as ShortestPathFinder and returns identical paths,
+    but stores the board in flat preallocated buffers instead of a fresh grid of Node
+    objects, and walks a precomputed neighbor table instead of building neighbor lists.
+
+    The distance field towards each target edge is kept between searches. When a structure is
+    added or removed, on_structure_added and on_structure_removed repair the fields, touching only
+    the tiles whose distance changes, instead of searching again. GameState registers its path
+    finder with its GameMap so they are called as the map changes, and a layout that differs from
+    the loaded one by a few structures is caught up the same way, so trying out a structure with
+    GameState.begin and rollback costs about as much as the tiles it affects.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+
+        * blocked (bytearray): 1 at the index of every tile holding a structure
+        * pathlength (list): The distance from each tile to the target of the last search, -1 if unreached
+
+    """
+    MAX_REPAIRS = 24
+
+    def __init__(self):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.initialized = False
+        self.blocked = bytearray(GRID_CELLS)
+        self.pathlength = [-1] * GRID_CELLS
+        self._loaded_layout = None
+        self._edge_fields = {}
+
+    def initialize_map(self, game_state):
+        """Loads the structures of a game state into the blocked buffer.
+        The buffer is built from the map's layout key, and is left untouched if the layout has not changed since the last load.
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+        """
+        self.initialized = True
+        self.game_state = game_state
+        layout = game_state.game_map.layout_key()
+        if layout == self._loaded_layout:
+            return
+        if self._loaded_layout is not None and popcount(layout ^ self._loaded_layout) <= self.MAX_REPAIRS:
+            changed = layout ^ self._loaded_layout
+            while changed:
+                lowest = changed & -changed
+                location = divmod(lowest.bit_length() - 1, ARENA_SIZE)
+                if layout & lowest:
+                    self.on_structure_added(location)
+                else:
+                    self.on_structure_removed(location)
+                changed ^= lowest
+            return
+        self._loaded_layout = layout
+        self._edge_fields = {}
+        blocked = self.blocked
+        blocked[:] = bytes(GRID_CELLS)
+        while layout:
+            lowest = layout & -layout
+            blocked[lowest.bit_length() - 1] = 1
+            layout ^= lowest
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.initialize_map(game_state)
+        start = start_point[0] * ARENA_SIZE + start_point[1]
+        direction = self._get_direction_from_endpoints(end_points)
+        field = self._edge_field(end_points)
+        if field[start] != -1:
+            self.pathlength = field
+            return self._get_path(start_point, field, direction)
+        # The edge is out of reach, so the unit heads for the most ideal tile of its pocket instead
+        targets = self._end_indices(end_points)
+        self.pathlength = [-1] * GRID_CELLS
+        ideal = self._idealness_search(start, targets, direction)
+        if ideal in targets:
+            self._validate(targets, self.pathlength)
+        else:
+            self._validate((ideal,), self.pathlength)
+        return self._get_path(start_point, self.pathlength, direction)
+
+    def navigate_batch(self, queries, game_state):
+        """Finds the paths for many units at once, sharing work between them
+
+        The board is only loaded once, the pockets of pathable space are labelled once, and the
+        validation search towards a set of endpoints is shared by every start that can reach them,
+        so pathing from every tile of an edge costs about one search per target edge.
+
+        Args:
+            * queries: A list of (start_point, end_points) pairs, as passed to navigate_multiple_endpoints
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each query, in order. Queries starting on a structure get None,
+            as do the queries left when the budget of the game state runs out.
+
+        """
+        self.initialize_map(game_state)
+        blocked = self.blocked
+        budget = getattr(game_state, "budget", None)
+        searches = {}
+        paths = []
+        for start_point, end_points in queries:
+            start = start_point[0] * ARENA_SIZE + start_point[1]
+            if blocked[start] or (budget is not None and budget.expired()):
+                paths.append(None)
+                continue
+            self.pathlength = self.pathlength_field(start, end_points, searches)
+            paths.append(self._get_path(start_point, self.pathlength, self._get_direction_from_endpoints(end_points)))
+        return paths
+
+    def pathlength_field(self, start, end_points, searches):
+        """Gets the pathlength field a unit standing at a tile follows, on the currently loaded blocked buffer.
+        Walking down the field from the tile with _choose_next_move gives the unit's path.
+
+        Args:
+            * start: The index x * ARENA_SIZE + y of an unblocked tile
+            * end_points: The end points of the unit, should be a list of edge locations
+            * searches: A dict in which pockets and fields are shared between calls. Empty it whenever blocked changes.
+
+        Returns:
+            A list with the pathlength of each tile, shared with every other start using the same field
+
+        """
+        if not searches:
+            searches.update(pocket_of=[-1] * GRID_CELLS, pockets=[], ideals={}, fields={})
+        pocket_of = searches["pocket_of"]
+        pockets = searches["pockets"]
+        if pocket_of[start] == -1:
+            pockets.append(self._label_pocket(start, len(pockets), pocket_of))
+        edge_key = tuple(map(tuple, end_points))
+        ideal_key = (pocket_of[start], edge_key)
+        ideals = searches["ideals"]
+        if ideal_key not in ideals:
+            ideals[ideal_key] = self._pocket_ideal(pockets[pocket_of[start]], end_points)
+        ideal = ideals[ideal_key]
+        field_key = edge_key if ideal is None else ideal
+        fields = searches["fields"]
+        if field_key not in fields:
+            if ideal is None:
+                fields[field_key] = self._edge_field(end_points)
+            else:
+                fields[field_key] = self._validate((ideal,), [-1] * GRID_CELLS)
+        return fields[field_key]
+
+    def on_structure_added(self, location):
+        """Marks a tile as blocked and repairs the distance fields kept for each target edge.
+        Only the tiles whose shortest route went through the new structure are searched again.
+
+        Args:
+            location: The [x, y] of the new structure
+
+        """
+        index = location[0] * ARENA_SIZE + location[1]
+        if self.blocked[index]:
+            return
+        self.blocked[index] = 1
+        if self._loaded_layout is not None:
+            self._loaded_layout |= 1 << index
+        for sources, field in self._edge_fields.values():
+            self._repair_blocked(index, sources, field)
+
+    def on_structure_removed(self, location):
+        """Marks a tile as free and repairs the distance fields kept for each target edge,
+        spreading the shorter distances the free tile opens up
+
+        Args:
+            location: The [x, y] of the removed structure
+
+        """
+        index = location[0] * ARENA_SIZE + location[1]
+        if not self.blocked[index]:
+            return
+        self.blocked[index] = 0
+        if self._loaded_layout is not None:
+            self._loaded_layout &= ~(1 << index)
+        for sources, field in self._edge_fields.values():
+            self._repair_unblocked(index, sources, field)
+
+    def _edge_field(self, end_points):
+        """The distance field towards a set of endpoints on the loaded blocked buffer, as _validate
+        would compute it. It is kept up to date as structures are added and removed, so it must not be written to.
+        """
+        key = tuple(map(tuple, end_points))
+        kept = self._edge_fields.get(key)
+        if kept is None:
+            sources = self._end_indices(end_points)
+            kept = (sources, self._validate(sources, [-1] * GRID_CELLS))
+            self._edge_fields[key] = kept
+        return kept[1]
+
+    def _repair_blocked(self, index, sources, field):
+        """Updates a distance field after the tile at index became blocked
+        """
+        blocked = self.blocked
+        old = field[index]
+        if index not in sources:
+            field[index] = -1
+        if old == -1:
+            return
+        # Find the tiles that lose their shortest route, level by level: a tile is affected
+        # when every neighbor one step closer to the sources is affected too
+        distance = {index: old}
+        affected = []
+        head = 0
+        queue = [index]
+        while head < len(queue):
+            current = queue[head]
+            head += 1
+            next_length = distance[current] + 1
+            for neighbor in NEIGHBORS[current]:
+                if neighbor < 0 or blocked[neighbor] or neighbor in distance or field[neighbor] != next_length:
+                    continue
+                supported = False
+                for other in NEIGHBORS[neighbor]:
+                    if other >= 0 and not blocked[other] and other not in distance and field[other] == next_length - 1:
+                        supported = True
+                        break
+                if supported:
+                    continue
+                distance[neighbor] = next_length
+                affected.append(neighbor)
+                queue.append(neighbor)
+        if not affected:
+            return
+
+        # Route the affected tiles again from the unaffected tiles around them
+        for tile in affected:
+            field[tile] = -1
+        heap = []
+        for tile in affected:
+            best = -1
+            for neighbor in NEIGHBORS[tile]:
+                if neighbor >= 0 and not blocked[neighbor] and field[neighbor] != -1 and (best == -1 or field[neighbor] < best):
+                    best = field[neighbor]
+            if best != -1:
+                heap.append((best + 1, tile))
+        heapq.heapify(heap)
+        while heap:
+            length, tile = heapq.heappop(heap)
+            if field[tile] != -1:
+                continue
+            field[tile] = length
+            for neighbor in NEIGHBORS[tile]:
+                if neighbor >= 0 and neighbor in distance and not blocked[neighbor] and field[neighbor] == -1:
+                    heapq.heappush(heap, (length + 1, neighbor))
+
+    def _repair_unblocked(self, index, sources, field):
+        """Updates a distance field after the tile at index became free
+        """
+        blocked = self.blocked
+        if index not in sources:
+            best = -1
+            for neighbor in NEIGHBORS[index]:
+                if neighbor >= 0 and not blocked[neighbor] and field[neighbor] != -1 and (best == -1 or field[neighbor] < best):
+                    best = field[neighbor]
+            if best == -1:
+                return
+            field[index] = best + 1
+        queue = [index]
+        head = 0
+        while head < len(queue):
+            current = queue[head]
+            head += 1
+            next_length = field[current] + 1
+            for neighbor in NEIGHBORS[current]:
+                if neighbor < 0 or blocked[neighbor]:
+                    continue
+                if field[neighbor] == -1 or field[neighbor] > next_length:
+                    field[neighbor] = next_length
+                    queue.append(neighbor)
+
+    def _label_pocket(self, start, label, pocket_of):
+        """Flood fills the pocket of pathable space containing start, returning its tiles
+        """
+        blocked = self.blocked
+        pocket_of[start] = label
+        tiles = [start]
+        head = 0
+        while head < len(tiles):
+            current = tiles[head]
+            head += 1
+            for neighbor in NEIGHBORS[current]:
+                if neighbor < 0 or blocked[neighbor] or pocket_of[neighbor] != -1:
+                    continue
+                pocket_of[neighbor] = label
+                tiles.append(neighbor)
+        return tiles
+
+    def _pocket_ideal(self, tiles, end_points):
+        """The most ideal tile of a pocket, or None if the pocket reaches the endpoints.
+        Idealness is unique per non-endpoint tile, so this matches the result of _idealness_search from any start in the pocket.
+        """
+        targets = self._end_indices(end_points)
+        if not targets.isdisjoint(tiles):
+            return None
+        direction = self._get_direction_from_endpoints(end_points)
+        return max(tiles, key=lambda index: self._get_idealness(index, direction))
+
+    def _end_indices(self, end_points):
+        return {x * ARENA_SIZE + y for x, y in end_points}
+
+    def _get_direction_from_endpoints(self, end_points):
+        """Returns a direction [x,y] representing the edge the end_points lie on
+        """
+        x, y = end_points[0]
+        return [-1 if x < HALF_ARENA else 1, -1 if y < HALF_ARENA else 1]
+
+    def _get_idealness(self, index, direction):
+        """Idealness of a tile which is not an endpoint, see ShortestPathFinder._get_idealness
+        """
+        x, y = divmod(index, ARENA_SIZE)
+        idealness = 28 * y if direction[1] == 1 else 28 * (27 - y)
+        idealness += x if direction[0] == 1 else 27 - x
+        return idealness
+
+    def _idealness_search(self, start, targets, direction):
+        """Finds the most ideal tile in the 'pocket' of pathable space around start.
+        Since no tile beats an endpoint, the search stops as soon as one is reached.
+        """
+        if start in targets:
+            return start
+        blocked = self.blocked
+        visited = bytearray(GRID_CELLS)
+        visited[start] = 1
+        best_idealness = self._get_idealness(start, direction)
+        most_ideal = start
+        queue = [start]
+        head = 0
+        while head < len(queue):
+            current = queue[head]
+            head += 1
+            for neighbor in NEIGHBORS[current]:
+                if neighbor < 0 or blocked[neighbor] or visited[neighbor]:
+                    continue
+                if neighbor in targets:
+                    return neighbor
+                idealness = self._get_idealness(neighbor, direction)
+                if idealness > best_idealness:
+                    best_idealness = idealness
+                    most_ideal = neighbor
+                visited[neighbor] = 1
+                queue.append(neighbor)
+        return most_ideal
+
+    def _validate(self, sources, pathlength):
+        """Breadth first search from the given sources, filling pathlength with the distance of each reached tile.
+        Blocked sources are given a pathlength of 0 but are not expanded.
+        """
+        blocked = self.blocked
+        for index in IN_BOUNDS_INDICES:
+            pathlength[index] = -1
+        queue = []
+        for source in sources:
+            pathlength[source] = 0
+            if not blocked[source]:
+                queue.append(source)
+        head = 0
+        while head < len(queue):
+            current = queue[head]
+            head += 1
+            next_length = pathlength[current] + 1
+            for neighbor in NEIGHBORS[current]:
+                if neighbor < 0 or blocked[neighbor] or pathlength[neighbor] != -1:
+                    continue
+                pathlength[neighbor] = next_length
+                queue.append(neighbor)
+        return pathlength
+
+    def _get_path(self, start_point, pathlength, direction):
+        """Walks down the pathlength field from start_point to a tile with a pathlength of 0
+        """
+        path = [start_point]
+        current = start_point[0] * ARENA_SIZE + start_point[1]
+        move_direction = 0
+        while pathlength[current] != 0:
+            next_move = self._choose_next_move(current, move_direction, pathlength, direction)
+            move_direction = self.VERTICAL if next_move // ARENA_SIZE == current // ARENA_SIZE else self.HORIZONTAL
+            path.append(list(divmod(next_move, ARENA_SIZE)))
+            current = next_move
+        return path
+
+    def _choose_next_move(self, current, previous_move_direction, pathlength, direction):
+        """Given the current tile, return the index of the best 'next step' for a unit to take
+        """
+        blocked = self.blocked
+        ideal_neighbor = current
+        best_pathlength = pathlength[current]
+        for neighbor in NEIGHBORS[current]:
+            if neighbor < 0 or blocked[neighbor]:
+                continue
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(current, neighbor, ideal_neighbor, previous_move_direction, direction):
+                continue
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
+        """Compare two tiles and return True if the unit would rather move to the new one,
+        see ShortestPathFinder._better_direction
+        """
+        prev_x, prev_y = divmod(prev_tile, ARENA_SIZE)
+        new_x, new_y = divmod(new_tile, ARENA_SIZE)
+        best_x, best_y = divmod(prev_best, ARENA_SIZE)
+        if previous_move_direction == self.HORIZONTAL and new_x != best_x:
+            return prev_y != new_y
+        if previous_move_direction == self.VERTICAL and new_y != best_y:
+            return prev_x != new_x
+        if previous_move_direction == 0:
+            return prev_y != new_y
+
+        if new_y == best_y:
+            return (direction[0] == 1 and new_x > best_x) or (direction[0] == -1 and new_x < best_x)
+        if new_x == best_x:
+            return (direction[1] == 1 and new_y > best_y) or (direction[1] == -1 and new_y < best_y)
+        return True
+
+    def print_map(self):
+        """Prints an ASCII version of the last searched map for debug purposes
+
+        """
+        if not self.initialized:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+            return
+
+        for y in range(ARENA_SIZE):
+            for x in range(ARENA_SIZE):
+                index = x * ARENA_SIZE + ARENA_SIZE - y - 1
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    sys.stderr.write(str(self.pathlength[index]).rjust(2) + " ")
+                else:
+                    sys.stderr.write("   ")
+            debug_write("")
+
+
+class PathCache:
+    """A bounded least recently used cache of paths
+
+    Paths are keyed by the structure layout of the map (see GameMap.layout_key), the start location
+    and the target edge, so a cached path stays valid for as long as the layout it was computed on.
+    Adding or removing a structure changes the layout key, which makes the old entries unreachable
+    until they age out.
+
+    Attributes :
+        * max_size (int): The maximum number of paths kept
+        * hits (int): The number of lookups that found a path
+        * misses (int): The number of lookups that did not find a path
+
+    """
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__paths = OrderedDict()
+
+    def __len__(self):
+        return len(self.__paths)
+
+    def key(self, game_map, start_location, target_edge):
+        """Builds the cache key of a path query on the given map
+        """
+        return (game_map.layout_key(), start_location[0], start_location[1], target_edge)
+
+    def get(self, key, start_location):
+        """Looks up a path
+
+        Args:
+            * key: A key built with PathCache.key
+            * start_location: The start location of the query, used as the first location of the returned path
+
+        Returns:
+            A fresh copy of the cached path, or None if it is not cached
+
+        """
+        path = self.__paths.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__paths.move_to_end(key)
+        return [start_location] + [list(location) for location in path]
+
+    def put(self, key, path):
+        """Stores a path, evicting the least recently used one if the cache is full
+        """
+        self.__paths[key] = tuple(tuple(location) for location in path[1:])
+        self.__paths.move_to_end(key)
+        while len(self.__paths) > self.max_size:
+            self.__paths.popitem(last=False)
+
+    def clear(self):
+        """Removes all paths and resets the hit and miss counters
+        """
+        self.__paths.clear()
+        self.hits = 0
+        self.misses = 0
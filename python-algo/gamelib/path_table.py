@@ -0,0 +1,193 @@
+import json
+import mmap
+import struct
+import sys
+
+from .game_state import GameState
+from .board_tables import ARENA_SIZE, EDGES, GRID_CELLS
+
+_MAGIC = b"C1PT"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_ENTRY = struct.Struct("<IH")
+_KEY_BYTES = (GRID_CELLS + 7) // 8
+_BLOCKED = 0xFFFF
+
+# Every edge tile, in the order of the entries stored for each layout
+_STARTS = [location for edge in EDGES for location in edge]
+_SLOTS = {location: slot for slot, location in enumerate(_STARTS)}
+# The edge a unit starting on an edge tile heads for, see GameState.get_target_edge
+_TARGETS = [(edge + 2) % 4 for edge in range(len(EDGES)) for _ in EDGES[edge]]
+
+
+class PathTable:
+    """Paths from every edge tile for a library of structure layouts, computed ahead of time
+    and read straight from a memory mapped file
+
+    Build the file offline with build_path_table, ship it next to your algo, open it once and
+    hand it to the GameState of every turn. find_path_to_edge and find_paths_to_edge_batch
+    look paths up in it before searching.
+
+        def on_game_start(self, config):
+            self.path_table = gamelib.PathTable("paths.bin")
+
+        def on_turn(self, turn_state):
+            game_state = gamelib.GameState(self.config, turn_state)
+            game_state.path_table = self.path_table
+
+    Only the path towards the edge get_target_edge picks is stored, and only for the exact layouts
+    in the library, so any other query returns None.
+
+    Attributes :
+        * filename (str): The file the table was opened from
+
+    """
+    def __init__(self, filename):
+        """Opens and maps a table built with build_path_table
+
+        Args:
+            filename: The path of the file
+
+        """
+        self.filename = filename
+        with open(filename, "rb") as table_file:
+            header = table_file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError("{} is too short to be a path table".format(filename))
+            self.__data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.__count = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            self.__data.close()
+            raise ValueError("{} is not a version {} path table".format(filename, _VERSION))
+        self.__keys_start = _HEADER.size
+        self.__entries_start = self.__keys_start + self.__count * _KEY_BYTES
+        self.__paths_start = self.__entries_start + self.__count * len(_STARTS) * _ENTRY.size
+        if len(self.__data) < self.__paths_start:
+            self.__data.close()
+            raise ValueError("{} is truncated".format(filename))
+
+    def __len__(self):
+        return self.__count
+
+    def __contains__(self, layout_key):
+        return self.__find(layout_key) is not None
+
+    def get(self, layout_key, start_location, target_edge):
+        """Looks up a path
+
+        Args:
+            * layout_key: The layout_key of the map
+            * start_location: The edge tile the path starts on
+            * target_edge: The edge the unit wants to reach
+
+        Returns:
+            The path find_path_to_edge would return, or None if it is not in the table
+
+        """
+        slot = _SLOTS.get((start_location[0], start_location[1]))
+        if slot is None or _TARGETS[slot] != target_edge:
+            return None
+        layout = self.__find(layout_key)
+        if layout is None:
+            return None
+        offset, length = _ENTRY.unpack_from(self.__data, self.__entries_start + (layout * len(_STARTS) + slot) * _ENTRY.size)
+        if length == _BLOCKED:
+            return None
+        steps = struct.unpack_from("<{}H".format(length), self.__data, self.__paths_start + 2 * offset)
+        return [start_location] + [list(divmod(index, ARENA_SIZE)) for index in steps]
+
+    def close(self):
+        """Unmaps the file
+        """
+        self.__data.close()
+
+    def __find(self, layout_key):
+        """Binary search over the sorted layout keys, returns the position of the layout or None
+        """
+        if layout_key >= 1 << GRID_CELLS:
+            return None
+        wanted = layout_key.to_bytes(_KEY_BYTES, "big")
+        data = self.__data
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.__keys_start + middle * _KEY_BYTES
+            key = data[start:start + _KEY_BYTES]
+            if key < wanted:
+                low = middle + 1
+            elif key > wanted:
+                high = middle
+            else:
+                return middle
+        return None
+
+
+def _empty_state(config):
+    """A turn 0 game state string with an empty board
+    """
+    units = [[] for _ in config["unitInformation"]]
+    return json.dumps({"turnInfo": [0, 0, -1], "p1Stats": [30, 0, 0, 0], "p2Stats": [30, 0, 0, 0],
+                       "p1Units": units, "p2Units": units})
+
+
+def build_path_table(config, layouts, filename):
+    """Computes the paths from every edge tile for each layout and writes them to a file PathTable can open
+
+    The empty board is always included. The paths only depend on where structures are, so a layout
+    is just the list of locations holding a structure of either player.
+
+    Args:
+        * config: The game config
+        * layouts: A list of layouts, each a list of [x, y] locations or a bitboard such as GameMap.layout_key()
+        * filename: The file to write
+
+    Returns:
+        The number of layouts written
+
+    """
+    wall = config["unitInformation"][0]["shorthand"]
+    state = _empty_state(config)
+    tables = {}
+    for layout in [[]] + list(layouts):
+        game_state = GameState(config, state)
+        game_state.suppress_warnings(True)
+        if isinstance(layout, int):
+            layout = [divmod(index, ARENA_SIZE) for index in range(GRID_CELLS) if layout >> index & 1]
+        for location in layout:
+            game_state.game_map.add_unit(wall, list(location), 0 if location[1] < ARENA_SIZE // 2 else 1)
+        key = game_state.game_map.layout_key()
+        if key in tables:
+            continue
+        queries = [(list(start), game_state.game_map.get_edge_locations(target)) for start, target in zip(_STARTS, _TARGETS)]
+        tables[key] = game_state._shortest_path_finder.navigate_batch(queries, game_state)
+
+    keys = sorted(tables)
+    entries = []
+    steps = []
+    for key in keys:
+        for path in tables[key]:
+            if path is None:
+                entries.append(_ENTRY.pack(0, _BLOCKED))
+                continue
+            entries.append(_ENTRY.pack(len(steps), len(path) - 1))
+            steps.extend(x * ARENA_SIZE + y for x, y in path[1:])
+
+    with open(filename, "wb") as table_file:
+        table_file.write(_HEADER.pack(_MAGIC, _VERSION, len(keys)))
+        for key in keys:
+            table_file.write(key.to_bytes(_KEY_BYTES, "big"))
+        table_file.write(b"".join(entries))
+        table_file.write(struct.pack("<{}H".format(len(steps)), *steps))
+    return len(keys)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.exit("Usage: python3 -m gamelib.path_table <config.json> <output file> [layouts.json]")
+    with open(sys.argv[1]) as config_file:
+        game_config = json.load(config_file)
+    library = []
+    if len(sys.argv) == 4:
+        with open(sys.argv[3]) as layouts_file:
+            library = json.load(layouts_file)
+    print("Wrote {} layouts to {}".format(build_path_table(game_config, library, sys.argv[2]), sys.argv[2]))
@@ -0,0 +1,200 @@
+import json
+import math
+import multiprocessing
+import threading
+import time
+
+from .game_state import GameState
+from .simulator import Simulator
+from .bitboard import locations_of
+from .rules import load_rules
+
+
+def snapshot(game_state):
+    """Serializes the board of a game state, including the spawns, removals and upgrades attempted this turn,
+    into the same json format the game engine sends at the start of a turn
+
+    Args:
+        game_state: The GameState to serialize
+
+    Returns:
+        A string that GameState(config, string) parses back into the same board
+
+    """
+    rules = load_rules(game_state.config)
+    type_index = rules.type_ids
+    remove_index = len(rules.unit_types) - 2
+    upgrade_index = len(rules.unit_types) - 1
+
+    game_map = game_state.game_map
+    players_units = []
+    for player_index in (0, 1):
+        units = [[] for _ in rules.unit_types]
+        occupied = 0
+        for unit_type, index in type_index.items():
+            if rules.unit_category[index] is not None:
+                occupied |= game_map.units_of(player_index, unit_type)
+        for location in locations_of(occupied):
+            for unit in game_map[location]:
+                if unit.player_index != player_index:
+                    continue
+                units[type_index[unit.unit_type]].append([unit.x, unit.y, unit.health, ""])
+                if unit.pending_removal:
+                    units[remove_index].append([unit.x, unit.y, 0, ""])
+                if unit.upgraded:
+                    units[upgrade_index].append([unit.x, unit.y, 0, ""])
+        players_units.append(units)
+
+    return json.dumps({
+        "turnInfo": [0, game_state.turn_number, -1],
+        "p1Stats": [game_state.my_health, game_state.get_resource(game_state.SP, 0), game_state.get_resource(game_state.MP, 0), game_state.my_time],
+        "p2Stats": [game_state.enemy_health, game_state.get_resource(game_state.SP, 1), game_state.get_resource(game_state.MP, 1), game_state.enemy_time],
+        "p1Units": players_units[0],
+        "p2Units": players_units[1],
+    }, separators=(",", ":"))
+
+
+def default_score(simulator):
+    """Scores a finished rollout from your point of view: health taken from the opponent counts the most,
+    then damage dealt to their structures, minus the same for your opponent
+
+    """
+    return 100 * (simulator.scored[0] - simulator.scored[1]) + simulator.structure_damage[0] - simulator.structure_damage[1]
+
+
+def _rollout(game_state, deployments, score, deadline):
+    """Simulates one candidate. Returns None if the deadline passed before the action phase finished.
+    """
+    simulator = Simulator(game_state, record_events=False)
+    for deployment in deployments:
+        simulator.deploy(*deployment)
+    while simulator.mobile_units_alive() and simulator.frame < Simulator.MAX_FRAMES:
+        if deadline is not None and time.time() > deadline:
+            return None
+        simulator.run(RolloutPool.FRAMES_PER_CHECK)
+    return score(simulator)
+
+
+_worker_config = None
+_worker_state = None
+
+
+def _start_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _evaluate_chunk(token, board, chunk, score, deadline):
+    """Runs in a worker. The board is parsed once per worker per evaluation and reused by every chunk of it.
+    """
+    global _worker_state
+    if _worker_state is None or _worker_state[0] != token:
+        _worker_state = (token, GameState(_worker_config, board))
+    game_state = _worker_state[1]
+    results = []
+    for index, deployments in chunk:
+        if time.time() > deadline:
+            break
+        results.append((index, _rollout(game_state, deployments, score, deadline)))
+    return results
+
+
+class RolloutPool:
+    """Scores candidate deployments by simulating the action phase on several cores at once
+
+    Create it in on_game_start so the worker processes are forked once, before the first turn,
+    instead of paying the start up cost inside a turn:
+
+        self.rollouts = gamelib.RolloutPool(config)
+
+    Every call to evaluate() ships the board to the workers as a compact json snapshot
+    rather than pickled GameUnits, and returns whatever has been scored when the deadline hits.
+
+    Attributes :
+        * config (JSON): The game config the workers were started with
+        * processes (int): The number of worker processes, 0 if candidates are evaluated in this process
+        * evaluated (int): The number of candidates scored by the last call to evaluate
+
+    """
+    FRAMES_PER_CHECK = 10
+    CHUNKS_PER_PROCESS = 4
+
+    def __init__(self, config, processes=None):
+        """Forks the worker processes
+
+        Args:
+            config: The game config
+            processes: The number of workers, one per core by default. With 0 no processes are started and
+                candidates are evaluated one after another in this process.
+
+        """
+        self.config = config
+        self.processes = multiprocessing.cpu_count() if processes is None else processes
+        self.evaluated = 0
+        self.__token = 0
+        self.__pool = None
+        if self.processes > 0:
+            try:
+                context = multiprocessing.get_context("fork")
+            except ValueError:
+                context = multiprocessing.get_context()
+            self.__pool = context.Pool(self.processes, initializer=_start_worker, initargs=(config,))
+
+    def evaluate(self, game_state, candidates, time_limit=None, score=default_score):
+        """Simulates the action phase once for every candidate and finds the best one
+
+        Args:
+            game_state: The GameState of the current turn, including anything you already spawned
+            candidates: A list of candidates, each a list of (unit_type, location, num, player_index) deployments
+                as taken by Simulator.deploy. Use player_index 0 for your own units.
+            time_limit: Seconds to spend at most. Candidates not finished by then are left unscored.
+                If None, the remaining time of game_state.budget is used.
+            score: A function taking a finished Simulator and returning a number, higher is better.
+                It is sent to the workers, so it must be defined at the top level of a module.
+
+        Returns:
+            A tuple (best_index, best_score, scores) where scores holds the score of every candidate,
+            None for the ones that were not finished. best_index is None if nothing was scored.
+
+        """
+        if time_limit is not None:
+            deadline = time.time() + time_limit
+        elif game_state.budget is not None:
+            deadline = game_state.budget.deadline_time()
+        else:
+            deadline = math.inf
+        scores = [None] * len(candidates)
+        if self.__pool is None:
+            for index, deployments in enumerate(candidates):
+                if time.time() > deadline:
+                    break
+                scores[index] = _rollout(game_state, deployments, score, deadline)
+        else:
+            self.__token += 1
+            board = snapshot(game_state)
+            indexed = list(enumerate(candidates))
+            size = max(1, math.ceil(len(indexed) / (self.processes * self.CHUNKS_PER_PROCESS)))
+            pending = [self.__pool.apply_async(_evaluate_chunk, (self.__token, board, indexed[start:start + size], score, deadline))
+                       for start in range(0, len(indexed), size)]
+            for result in pending:
+                # Once the deadline has passed, chunks that already finished are still collected
+                result.wait(max(0, min(deadline - time.time(), threading.TIMEOUT_MAX)))
+                if not result.ready():
+                    continue
+                for index, value in result.get():
+                    scores[index] = value
+
+        best_index = None
+        for index, value in enumerate(scores):
+            if value is not None and (best_index is None or value > scores[best_index]):
+                best_index = index
+        self.evaluated = sum(1 for value in scores if value is not None)
+        return best_index, (scores[best_index] if best_index is not None else None), scores
+
+    def close(self):
+        """Stops the worker processes. Call it when the game is over.
+        """
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool.join()
+            self.__pool = None
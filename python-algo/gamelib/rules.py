@@ -0,0 +1,119 @@
+class RulesTable:
+    """The unit rules of a game config, compiled into flat lists indexed by unit type id
+
+    The type id of a unit type is its index in config["unitInformation"]. Stats that change
+    when a unit is upgraded are a pair of lists, the first for normal units and the second for
+    upgraded ones, so they are read as table.attack_range[upgraded][type_id].
+
+        rules = game_state.rules
+        turret = rules.type_ids[TURRET]
+        rules.attack_range[True][turret]
+
+    Build it with load_rules, which compiles each config once and is what the rest of gamelib uses.
+
+    Attributes :
+        * config (JSON): The config the table was built from
+        * unit_types (list): The shorthand of each type id
+        * type_ids (dict): The type id of each shorthand
+        * unit_category (list): The unitCategory of each type, 0 for structures, 1 for mobile units and None for REMOVE and UPGRADE
+        * stationary (list): Whether each type is a structure
+        * cost (list): The cost (SP, MP) of each type
+        * upgrade_cost (list): The cost (SP, MP) of upgrading each type, as returned by GameState.type_cost
+        * total_cost (tuple): Two lists, the cost (SP, MP) paid in total for a unit of each type, as returned by GameUnit.cost
+        * upgradable (list): Whether each type can be upgraded
+        * refund_percentage (list): The fraction of its cost given back when a structure of each type is removed
+        * health (tuple): Two lists, the starting health of each type
+        * speed (tuple): Two lists, the speed of each type
+        * damage_f (tuple): Two lists, the damage each type deals to structures
+        * damage_i (tuple): Two lists, the damage each type deals to mobile units
+        * attack_range (tuple): Two lists, the attack range of each type
+        * shield_range (tuple): Two lists, the shield range of each type
+        * shield_per_unit (tuple): Two lists, the shield given by each type
+        * shield_bonus_per_y (tuple): Two lists, the extra shield given by each type per row
+        * breach_damage (list): The health a mobile unit of each type takes from the opponent when it reaches their edge
+        * self_destruct_damage_f (list): The self destruct damage of each type to structures
+        * self_destruct_damage_i (list): The self destruct damage of each type to mobile units
+        * self_destruct_range (list): The self destruct range of each type
+        * self_destruct_steps (list): The steps a unit of each type must take before its self destruct does damage
+        * max_attack_range (float): The longest attack range of any type, upgraded or not
+        * get_hit_radius (float): The radius added to ranges when checking if a location is in range
+
+    """
+    def __init__(self, config):
+        """Compiles the table
+
+        Args:
+            config: The game config
+
+        """
+        unit_information = config["unitInformation"]
+        self.config = config
+        self.unit_types = [information.get("shorthand") for information in unit_information]
+        self.type_ids = {unit_type: type_id for type_id, unit_type in enumerate(self.unit_types)}
+        self.unit_category = [information.get("unitCategory") for information in unit_information]
+        self.stationary = [category == 0 for category in self.unit_category]
+        self.cost = []
+        self.upgrade_cost = []
+        self.total_cost = ([], [])
+        self.upgradable = []
+        self.refund_percentage = []
+        self.breach_damage = []
+        self.self_destruct_damage_f = []
+        self.self_destruct_damage_i = []
+        self.self_destruct_range = []
+        self.self_destruct_steps = []
+        self.health = ([], [])
+        self.speed = ([], [])
+        self.damage_f = ([], [])
+        self.damage_i = ([], [])
+        self.attack_range = ([], [])
+        self.shield_range = ([], [])
+        self.shield_per_unit = ([], [])
+        self.shield_bonus_per_y = ([], [])
+
+        upgradable_stats = ((self.health, "startHealth"), (self.speed, "speed"), (self.damage_f, "attackDamageTower"),
+                            (self.damage_i, "attackDamageWalker"), (self.attack_range, "attackRange"),
+                            (self.shield_range, "shieldRange"), (self.shield_per_unit, "shieldPerUnit"),
+                            (self.shield_bonus_per_y, "shieldBonusPerY"))
+        for information in unit_information:
+            upgrade = information.get("upgrade")
+            self.upgradable.append(upgrade is not None)
+            upgrade = upgrade or {}
+            cost = (information.get("cost1", 0), information.get("cost2", 0))
+            self.cost.append(cost)
+            self.upgrade_cost.append((upgrade.get("cost1", cost[0]), upgrade.get("cost2", cost[1])))
+            self.total_cost[0].append(cost)
+            self.total_cost[1].append((cost[0] + upgrade.get("cost1", 0), cost[1] + upgrade.get("cost2", 0)))
+            for stat, key in upgradable_stats:
+                value = information.get(key, 0)
+                stat[0].append(value)
+                stat[1].append(upgrade.get(key, value))
+            self.refund_percentage.append(information.get("refundPercentage", 0))
+            self.breach_damage.append(information.get("playerBreachDamage", 1))
+            self.self_destruct_damage_f.append(information.get("selfDestructDamageTower", 0))
+            self.self_destruct_damage_i.append(information.get("selfDestructDamageWalker", 0))
+            self.self_destruct_range.append(information.get("selfDestructRange", 0))
+            self.self_destruct_steps.append(information.get("selfDestructStepsRequired", 0))
+
+        self.max_attack_range = max(self.attack_range[0] + self.attack_range[1], default=0)
+        self.get_hit_radius = unit_information[0].get("getHitRadius", 0) if unit_information else 0
+
+
+_loaded_rules = (None, None)
+
+
+def load_rules(config):
+    """Gets the RulesTable of a game config, compiling it the first time the config is seen.
+    The table of the last config loaded is kept, so calling this every turn costs nothing.
+
+    Args:
+        config: The game config
+
+    Returns:
+        The RulesTable of the config
+
+    """
+    global _loaded_rules
+    if _loaded_rules[0] is not config:
+        _loaded_rules = (config, RulesTable(config))
+    return _loaded_rules[1]
@@ -0,0 +1,358 @@
+import math
+
+from .navigation import GridPathFinder
+from .board_tables import ARENA_SIZE, HALF_ARENA, EDGES, EDGE_SETS, range_offsets
+from .bitboard import locations_of
+from .unit import GameUnit
+from .rules import load_rules
+
+
+class Simulator:
+    """Plays out an action phase locally
+
+    The simulator copies the units of a GameState into flat per-attribute lists and then
+    runs frames with the same steps as the game engine:
+
+        1. Supports shield friendly mobile units that have entered their range
+        2. Mobile units move along their path, scoring when they reach their target edge
+           or self destructing when their path ends anywhere else
+        3. Every unit attacks the target get_target would choose, all at the same time
+        4. Units with no health left are removed, and paths are updated if structures died
+
+    Units deployed with attempt_spawn are already on the game_map of the state, so they take part
+    automatically. Enemy deployments can be added with deploy().
+
+    Attributes :
+        * frame (int): The number of frames simulated so far
+        * health ([float, float]): The health of each player
+        * scored ([float, float]): The damage each player dealt to their opponent's health by breaching
+        * structure_damage ([float, float]): The damage each player dealt to their opponent's structures
+        * frames (list): If events are recorded, one dict per frame with the 'turnInfo' and 'events' of an engine action frame
+
+    """
+    MAX_FRAMES = 1000
+
+    def __init__(self, game_state, record_events=True):
+        """Copies the board of a game state
+
+        Args:
+            * game_state: The GameState to simulate the action phase of
+            * record_events: If true, the events of every frame are kept in frames. Turn off for faster rollouts.
+
+        """
+        self.config = game_state.config
+        self.turn_number = game_state.turn_number
+        self.record_events = record_events
+        self.frame = 0
+        self.frames = []
+        self.health = [game_state.my_health, game_state.enemy_health]
+        self.scored = [0, 0]
+        self.structure_damage = [0, 0]
+        self.__rules = load_rules(self.config)
+        self.__get_hit_radius = self.__rules.get_hit_radius
+        self.__type_index = self.__rules.type_ids
+
+        # Per unit attributes, indexed by unit number
+        self.unit_type = []
+        self.player = []
+        self.x = []
+        self.y = []
+        self.health_of = []
+        self.alive = []
+        self.stationary = []
+        self.damage_f = []
+        self.damage_i = []
+        self.attack_range = []
+        self.shield_range = []
+        self.shield_per_unit = []
+        self.shield_bonus_per_y = []
+        self.speed = []
+        self.move_progress = []
+        self.move_direction = []
+        self.steps = []
+        self.target_edge = []
+        self.shielded_by = []
+
+        self.__structure_at = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        self.__mobile = []
+        self.__supports = []
+        self.__attackers = []
+        self.__path_finder = GridPathFinder()
+        self.__searches = {}
+        self.__offset_ranks = {}
+        self.__events = None
+
+        game_map = game_state.game_map
+        for player_index in (0, 1):
+            occupied = 0
+            for unit_type, type_id in self.__type_index.items():
+                if self.__rules.unit_category[type_id] is not None:
+                    occupied |= game_map.units_of(player_index, unit_type)
+            for location in locations_of(occupied):
+                for unit in game_map[location]:
+                    if unit.player_index == player_index:
+                        self.__add(unit)
+
+    def deploy(self, unit_type, location, num=1, player_index=1):
+        """Adds mobile units that were not spawned through the game state, such as a guess of the enemy's attack
+
+        Args:
+            * unit_type: The type of mobile unit
+            * location: The location to spawn the units at
+            * num: The number of units
+            * player_index: The player controlling the units, 1 for the enemy by default
+
+        """
+        for _ in range(num):
+            self.__add(GameUnit(unit_type, self.config, player_index, None, location[0], location[1]))
+
+    def __add(self, unit):
+        index = len(self.unit_type)
+        self.unit_type.append(unit.unit_type)
+        self.player.append(unit.player_index)
+        self.x.append(unit.x)
+        self.y.append(unit.y)
+        self.health_of.append(unit.health)
+        self.alive.append(True)
+        self.stationary.append(unit.stationary)
+        self.damage_f.append(unit.damage_f)
+        self.damage_i.append(unit.damage_i)
+        self.attack_range.append(unit.attackRange)
+        self.shield_range.append(unit.shieldRange)
+        self.shield_per_unit.append(unit.shieldPerUnit)
+        self.shield_bonus_per_y.append(unit.shieldBonusPerY)
+        self.speed.append(unit.speed)
+        self.move_progress.append(0)
+        self.move_direction.append(0)
+        self.steps.append(0)
+        self.shielded_by.append(None if unit.stationary else set())
+        if unit.stationary:
+            self.target_edge.append(None)
+            self.__structure_at[unit.x * ARENA_SIZE + unit.y] = index
+            self.__path_finder.on_structure_added((unit.x, unit.y))
+            if unit.shieldPerUnit > 0 or unit.shieldBonusPerY > 0:
+                self.__supports.append(index)
+        else:
+            self.target_edge.append(self.__get_target_edge(unit.x, unit.y))
+            self.__mobile.append(index)
+        if unit.damage_f + unit.damage_i > 0:
+            self.__attackers.append(index)
+        return index
+
+    def __get_target_edge(self, x, y):
+        """See GameState.get_target_edge
+        """
+        left = x < HALF_ARENA
+        bottom = y < HALF_ARENA
+        if left and bottom:
+            return 0
+        elif left:
+            return 3
+        elif bottom:
+            return 1
+        return 2
+
+    def mobile_units_alive(self):
+        """The number of mobile units still on the board
+        """
+        return len(self.__mobile)
+
+    def run(self, max_frames=None):
+        """Simulates frames until no mobile units are left
+
+        Args:
+            max_frames: Stop after this many frames even if mobile units are left
+
+        Returns:
+            The simulator, so results can be read with simulator.run().health and similar
+
+        """
+        if self.frame == 0:
+            self.__start_frame()
+            for index in self.__mobile:
+                self.__event("spawn", [self.__location(index), self.__type_index[self.unit_type[index]], str(index), self.player[index] + 1])
+            self.__end_frame()
+        limit = self.MAX_FRAMES if max_frames is None else self.frame + max_frames
+        while self.__mobile and self.frame < limit:
+            self.step()
+        return self
+
+    def step(self):
+        """Simulates a single frame
+        """
+        self.__start_frame()
+        self.__shield()
+        self.__move()
+        self.__attack()
+        self.__remove_dead()
+        self.__end_frame()
+
+    def __start_frame(self):
+        if self.record_events:
+            self.__events = {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [],
+                             "spawn": [], "death": [], "attack": [], "melee": []}
+
+    def __end_frame(self):
+        if self.record_events:
+            self.frames.append({"turnInfo": [1, self.turn_number, self.frame], "events": self.__events})
+        self.frame += 1
+
+    def __event(self, kind, event):
+        if self.record_events:
+            self.__events[kind].append(event)
+
+    def __location(self, index):
+        return [self.x[index], self.y[index]]
+
+    def __in_range(self, attacker, target, radius):
+        """Matches GameMap.get_locations_in_range, which includes the getHitRadius
+        """
+        dx = self.x[target] - self.x[attacker]
+        dy = self.y[target] - self.y[attacker]
+        return math.sqrt(dx * dx + dy * dy) < radius + self.__get_hit_radius
+
+    def __shield(self):
+        for support in self.__supports:
+            if not self.alive[support]:
+                continue
+            y = self.y[support] if self.player[support] == 0 else ARENA_SIZE - 1 - self.y[support]
+            amount = self.shield_per_unit[support] + self.shield_bonus_per_y[support] * y
+            for index in self.__mobile:
+                if self.player[index] != self.player[support] or support in self.shielded_by[index]:
+                    continue
+                if self.__in_range(support, index, self.shield_range[support]):
+                    self.shielded_by[index].add(support)
+                    self.health_of[index] += amount
+                    self.__event("shield", [self.__location(support), self.__location(index), amount,
+                                            self.__type_index[self.unit_type[index]], str(support), str(index), self.player[support] + 1])
+
+    def __move(self):
+        finder = self.__path_finder
+        for index in list(self.__mobile):
+            self.move_progress[index] += self.speed[index]
+            if self.move_progress[index] < 1 - 1e-9:
+                continue
+            self.move_progress[index] -= 1
+            current = self.x[index] * ARENA_SIZE + self.y[index]
+            end_points = EDGES[self.target_edge[index]]
+            field = finder.pathlength_field(current, end_points, self.__searches)
+            if field[current] == 0:
+                self.__self_destruct(index)
+                continue
+            direction = finder._get_direction_from_endpoints(end_points)
+            next_move = finder._choose_next_move(current, self.move_direction[index], field, direction)
+            self.move_direction[index] = finder.VERTICAL if next_move // ARENA_SIZE == current // ARENA_SIZE else finder.HORIZONTAL
+            old_location = self.__location(index)
+            self.x[index], self.y[index] = divmod(next_move, ARENA_SIZE)
+            self.steps[index] += 1
+            self.__event("move", [old_location, self.__location(index), [-1, -1], self.__type_index[self.unit_type[index]], str(index), self.player[index] + 1])
+            if (self.x[index], self.y[index]) in EDGE_SETS[self.target_edge[index]]:
+                self.__breach(index)
+
+    def __breach(self, index):
+        damage = self.__rules.breach_damage[self.__type_index[self.unit_type[index]]]
+        player = self.player[index]
+        self.health[1 - player] -= damage
+        self.scored[player] += damage
+        self.__event("breach", [self.__location(index), damage, self.__type_index[self.unit_type[index]], str(index), player + 1])
+        self.__kill(index)
+
+    def __self_destruct(self, index):
+        rules = self.__rules
+        type_id = self.__type_index[self.unit_type[index]]
+        hit = []
+        if self.steps[index] >= rules.self_destruct_steps[type_id]:
+            damage_f = rules.self_destruct_damage_f[type_id]
+            damage_i = rules.self_destruct_damage_i[type_id]
+            radius = rules.self_destruct_range[type_id]
+            for other in range(len(self.alive)):
+                if not self.alive[other] or self.player[other] == self.player[index] or not self.__in_range(index, other, radius):
+                    continue
+                damage = damage_f if self.stationary[other] else damage_i
+                if damage > 0:
+                    self.__damage(other, damage, self.player[index])
+                    hit.append(self.__location(other))
+            self.__event("selfDestruct", [self.__location(index), hit, damage_f, self.__type_index[self.unit_type[index]], str(index), self.player[index] + 1])
+        self.__kill(index)
+
+    def __attack(self):
+        """Chooses every target first, then applies the damage, so all units attack at the same time
+        """
+        chosen = {}
+        attacks = []
+        for attacker in self.__attackers:
+            if not self.alive[attacker]:
+                continue
+            key = (self.x[attacker], self.y[attacker], self.player[attacker], self.attack_range[attacker],
+                   self.damage_f[attacker] > 0, self.damage_i[attacker] > 0)
+            if key not in chosen:
+                chosen[key] = self.__choose_target(attacker)
+            target = chosen[key]
+            if target is not None:
+                attacks.append((attacker, target))
+        for attacker, target in attacks:
+            damage = self.damage_f[attacker] if self.stationary[target] else self.damage_i[attacker]
+            self.__event("attack", [self.__location(attacker), self.__location(target), damage, self.__type_index[self.unit_type[attacker]],
+                                    str(attacker), str(target), self.player[attacker] + 1])
+            self.__damage(target, damage, self.player[attacker])
+
+    def __choose_target(self, attacker):
+        """Follows the priority rules of GameState.get_target:
+        mobile units > nearest > lowest health > lowest y for player 0 / highest for player 1 > furthest from the center
+        Ties go to the unit met first when scanning the range disk.
+        """
+        player = self.player[attacker]
+        ax, ay = self.x[attacker], self.y[attacker]
+        offsets = range_offsets(self.attack_range[attacker], self.__get_hit_radius)
+        best = None
+        best_key = None
+        if self.damage_i[attacker] > 0:
+            ranks = self.__offset_ranks.get(self.attack_range[attacker])
+            if ranks is None:
+                ranks = {offset: rank for rank, offset in enumerate(offsets)}
+                self.__offset_ranks[self.attack_range[attacker]] = ranks
+            for index in self.__mobile:
+                if self.player[index] == player or not self.__in_range(attacker, index, self.attack_range[attacker]):
+                    continue
+                dx, dy = self.x[index] - ax, self.y[index] - ay
+                key = (dx * dx + dy * dy, self.health_of[index], self.y[index] if player == 0 else -self.y[index],
+                       -abs(HALF_ARENA - 0.5 - self.x[index]), ranks[(dx, dy)], index)
+                if best_key is None or key < best_key:
+                    best, best_key = index, key
+            if best is not None:
+                return best
+        if self.damage_f[attacker] > 0:
+            structure_at = self.__structure_at
+            for dx, dy in offsets:
+                x, y = ax + dx, ay + dy
+                if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+                    continue
+                index = structure_at[x * ARENA_SIZE + y]
+                if index == -1 or self.player[index] == player:
+                    continue
+                key = (dx * dx + dy * dy, self.health_of[index], y if player == 0 else -y, -abs(HALF_ARENA - 0.5 - x))
+                if best_key is None or key < best_key:
+                    best, best_key = index, key
+        return best
+
+    def __damage(self, index, damage, source_player):
+        self.health_of[index] -= damage
+        if self.stationary[index]:
+            self.structure_damage[source_player] += damage
+        self.__event("damage", [self.__location(index), damage, self.__type_index[self.unit_type[index]], str(index), self.player[index] + 1])
+
+    def __kill(self, index):
+        self.alive[index] = False
+        self.__event("death", [self.__location(index), self.__type_index[self.unit_type[index]], str(index), self.player[index] + 1, False])
+        if self.stationary[index]:
+            location = self.x[index] * ARENA_SIZE + self.y[index]
+            self.__structure_at[location] = -1
+            self.__path_finder.on_structure_removed((self.x[index], self.y[index]))
+            self.__searches.clear()
+        else:
+            self.__mobile.remove(index)
+
+    def __remove_dead(self):
+        for index in range(len(self.alive)):
+            if self.alive[index] and self.health_of[index] <= 0:
+                self.__kill(index)
@@ -1,7 +1,24 @@
 import unittest
+import io
+import sys
 import json
+import random
+import math
+import os
+import tempfile
 from .game_state import GameState
 from .unit import GameUnit
+from .algocore import AlgoCore, get_state_type, extract_fields
+from .navigation import ShortestPathFinder, GridPathFinder, PathCache
+from . import bitboard
+from .simulator import Simulator
+from .rollout import RolloutPool, snapshot
+from .time_budget import TurnBudget
+from .action_phase import ActionPhaseTracker
+from .unit_table import UnitTable
+from .rules import load_rules
+from .path_table import PathTable, build_path_table
+from .board_tables import EDGES
 
 class BasicTests(unittest.TestCase):
 
@@ -256,6 +273,623 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def make_random_map(self, seed, density=0.3):
+        game = self.make_turn_0_map()
+        rng = random.Random(seed)
+        for location in game.game_map:
+            if rng.random() < density:
+                game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, 0 if location[1] < 14 else 1)
+        return game
+
+    def test_grid_path_finder_matches_shortest_path_finder(self):
+        for seed in range(3):
+            game = self.make_random_map(seed)
+            legacy = ShortestPathFinder()
+            grid = GridPathFinder()
+            for location in random.Random(seed).sample(list(game.game_map), 20):
+                if game.contains_stationary_unit(location):
+                    continue
+                for edge in [game.get_target_edge(location), game.game_map.TOP_RIGHT, game.game_map.BOTTOM_LEFT]:
+                    end_points = game.game_map.get_edge_locations(edge)
+                    expected = legacy.navigate_multiple_endpoints(location, end_points, game)
+                    self.assertEqual(expected, grid.navigate_multiple_endpoints(location, end_points, game), "Paths differ from {} on seed {}".format(location, seed))
+
+    def test_find_paths_to_edge_batch(self):
+        for seed in range(3):
+            game = self.make_random_map(seed, 0.4)
+            locations = list(game.game_map)
+            for edge in [None, game.game_map.TOP_LEFT]:
+                expected = [game.find_path_to_edge(location, edge) for location in locations]
+                game.path_cache.clear()
+                self.assertEqual(expected, game.find_paths_to_edge_batch(locations, edge), "Batched paths differ on seed {}".format(seed))
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual((0, 1), (game.path_cache.hits, game.path_cache.misses), "The first query should miss")
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Cached path differs")
+        self.assertEqual((1, 1), (game.path_cache.hits, game.path_cache.misses), "The second query should hit")
+        game.game_map.add_unit("FF", path[5])
+        self.assertNotEqual(path, game.find_path_to_edge([13, 0]), "Adding a structure should change the path")
+        game.game_map.remove_unit(path[5])
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Removing the structure should restore the path")
+        self.assertEqual((2, 2), (game.path_cache.hits, game.path_cache.misses), "The restored layout should hit")
+        game.path_cache.max_size = 1
+        game.find_path_to_edge([14, 0])
+        self.assertEqual(1, len(game.path_cache), "The cache should be bounded")
+
+        cache = PathCache(max_size=2)
+        keys = [cache.key(game.game_map, [x, 0], game.game_map.TOP_RIGHT) for x in (13, 14, 15)]
+        self.assertEqual((game.game_map.layout_key(), 13, 0, game.game_map.TOP_RIGHT), keys[0], "Keys should hold the layout, start and edge")
+        cache.put(keys[0], [[13, 0], [13, 1]])
+        cache.put(keys[1], [[14, 0], [14, 1]])
+        self.assertEqual([[13, 0], [13, 1]], cache.get(keys[0], [13, 0]), "Cached path differs")
+        cache.put(keys[2], [[15, 0], [15, 1]])
+        self.assertIsNone(cache.get(keys[1], [14, 0]), "The least recently used path should be evicted")
+        self.assertIsNotNone(cache.get(keys[0], [13, 0]), "A path used since it was added should be kept")
+        game.game_map.add_unit("FF", [10, 5])
+        self.assertNotEqual(keys[0], cache.key(game.game_map, [13, 0], game.game_map.TOP_RIGHT), "A new layout should give a new key")
+
+    def test_bitboards(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [3, 12], 0)
+        game.game_map.add_unit("DF", [20, 15], 1)
+        game.game_map.add_unit("EI", [5, 15], 1)
+        game.game_map.add_unit("FF", [5, 15], 1)
+        game.attempt_upgrade([3, 12])
+        self.assertEqual(bitboard.mask_of([[3, 12], [20, 15], [5, 15]]), game.game_map.blocked_mask(), "Blocked mask is wrong")
+        self.assertEqual([[20, 15]], bitboard.locations_of(game.game_map.structures_of(1, "DF")), "Enemy turrets are wrong")
+        self.assertEqual(2, game.game_map.count_structures(1), "There should be 2 enemy structures")
+        self.assertEqual(1, game.game_map.count_structures(1, region=bitboard.LEFT_HALF), "There should be 1 enemy structure on the left")
+        self.assertEqual(0, game.game_map.units_of(1, "EI"), "Replacing a location should clear its mobile units")
+        self.assertEqual(bitboard.location_bit([3, 12]), game.game_map.upgraded_mask(0), "Upgrades are not tracked")
+        game.game_map.remove_unit([3, 12])
+        self.assertEqual(0, game.game_map.structures_of(0) | game.game_map.upgraded_mask(), "Removed units are still tracked")
+
+    def test_bitboards_from_parsed_state(self):
+        config = self.make_turn_0_map().config
+        turn = """{"p2Units":[[],[],[[4,16,75.0,"1"]],[],[],[],[],[[4,16,0,"2"]]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,5,60.0,"3"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        game = GameState(config, turn)
+        self.assertEqual(bitboard.location_bit([4, 16]), game.game_map.structures_of(1, "DF"), "Parsed turret is missing")
+        self.assertEqual(bitboard.location_bit([4, 16]), game.game_map.upgraded_mask(1), "Parsed upgrade is missing")
+        self.assertEqual(bitboard.location_bit([13, 5]), game.game_map.structures_of(0), "Parsed wall is missing")
+
+    def test_bitboards_follow_list_edits(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        bit = 1 << (13 * 28 + 5)
+        game_map[13, 5].append(GameUnit("FF", game.config, 0, None, 13, 5))
+        self.assertTrue(game.contains_stationary_unit([13, 5]), "A structure appended to the list should block its location")
+        self.assertEqual(bit, game_map.structures_of(0, "FF"), "The appended structure should be in the bitboards")
+        game_map[13, 5].pop()
+        self.assertFalse(game.contains_stationary_unit([13, 5]), "Popping the structure should clear its location")
+        game_map[13, 5].extend([GameUnit("PI", game.config, 1, None, 13, 5), GameUnit("PI", game.config, 1, None, 13, 5)])
+        self.assertEqual((0, bit), (game_map.blocked_mask(), game_map.units_of(1, "PI")), "Mobile units should not block")
+        del game_map[13, 5][:]
+        self.assertEqual(0, game_map.units_of(1, "PI"), "Emptying the list should clear the bitboards")
+
+    def test_static_tables(self):
+        game = self.make_turn_0_map()
+        edge = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT)
+        edge[0][0] = 99
+        self.assertEqual([13, 0], game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT)[0], "Edges should not share state between calls")
+        self.assertTrue(game.can_spawn("SI", [0, 13]), "We should be able to spawn on the left edge")
+        self.assertFalse(game.can_spawn("SI", [1, 13]), "We should not be able to spawn a mobile unit off the edge")
+        self.assertFalse(game.game_map.in_arena_bounds([0, 0]), "The corners are not in the arena")
+        for location in [[13, 13], [0, 13], [13, 0], [20, 20]]:
+            for radius in [0, 1, 2.5, 3.5, 4.5, 7]:
+                # The square scan get_locations_in_range used before the offsets were precomputed
+                expected = [[x, y] for x in range(location[0] - math.ceil(radius), location[0] + math.ceil(radius) + 1)
+                            for y in range(location[1] - math.ceil(radius), location[1] + math.ceil(radius) + 1)
+                            if game.game_map.in_arena_bounds([x, y]) and game.game_map.distance_between_locations(location, [x, y]) < radius + 0.01]
+                self.assertEqual(sorted(expected), sorted(game.game_map.get_locations_in_range(location, radius)), "Wrong locations in range {} of {}".format(radius, location))
+
+    def test_threat_map(self):
+        game = self.make_random_map(7, 0.2)
+        game.attempt_upgrade(list(game.game_map))
+        for player_index in [0, 1]:
+            threat = game.threat_map(player_index)
+            for location in list(game.game_map):
+                attackers = game.get_attackers(location, player_index)
+                self.assertEqual(len(attackers), threat.attackers_at(location), "Wrong attacker count at {}".format(location))
+                self.assertEqual(sum(unit.damage_i for unit in attackers), threat.damage_at(location), "Wrong damage at {}".format(location))
+        path = game.find_paths_to_edge_batch([[13, 0], [14, 0]])[0] or []
+        self.assertEqual(sum(game.threat_map(0).damage_at(location) for location in path), game.threat_map(0).path_damage(path), "Path damage is not the sum of its locations")
+
+    def test_simulator_breach(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        game.attempt_spawn("PI", [13, 0], 2)
+        simulator = Simulator(game).run()
+        moved = [[13, 0]] + [event[1] for frame in simulator.frames for event in frame["events"]["move"] if event[4] == "0"]
+        self.assertEqual(path, moved, "The simulated unit should follow find_path_to_edge")
+        self.assertEqual([30, 28], simulator.health, "Both units should have scored")
+        self.assertEqual(len(path), len(simulator.frames), "A speed 1 unit should move every frame")
+
+    def test_simulator_combat(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 3], 1)
+        game.attempt_spawn("PI", [13, 0])
+        simulator = Simulator(game).run()
+        self.assertEqual(30, simulator.health[1], "The scout should have died to the turret")
+        attacks = [event for frame in simulator.frames for event in frame["events"]["attack"]]
+        self.assertTrue(any(event[6] == 2 and event[2] == 5.0 for event in attacks), "The turret never attacked")
+        self.assertTrue(any(event[6] == 1 and event[1] == [13, 3] for event in attacks), "The scout never attacked the turret")
+        self.assertEqual(2.0 * sum(1 for event in attacks if event[6] == 1), simulator.structure_damage[0], "Structure damage is not tracked")
+
+    def test_simulator_self_destruct(self):
+        game = self.make_turn_0_map()
+        for x in range(6, 22):
+            game.game_map.add_unit("FF", [x, 8], 0)
+        for location in [[5, 8], [4, 9], [3, 10], [2, 11], [1, 12], [0, 13], [22, 8], [23, 9], [24, 10], [25, 11], [26, 12], [27, 13]]:
+            game.game_map.add_unit("FF", location, 1 if location[1] > 13 else 0)
+        game.attempt_spawn("PI", [13, 0])
+        simulator = Simulator(game).run()
+        events = [event for frame in simulator.frames for event in frame["events"]["selfDestruct"]]
+        self.assertEqual(1, len(events), "The walled in scout should self destruct")
+        self.assertEqual([30, 30], simulator.health, "Nobody should have scored")
+
+    def test_snapshot(self):
+        game = self.make_random_map(3, 0.2)
+        game.attempt_upgrade(list(game.game_map)[::3])
+        game.attempt_remove(list(game.game_map)[::5])
+        copy = GameState(game.config, snapshot(game))
+        self.assertEqual(game.game_map.layout_key(), copy.game_map.layout_key(), "The snapshot lost structures")
+        self.assertEqual(game.game_map.upgraded_mask(), copy.game_map.upgraded_mask(), "The snapshot lost upgrades")
+        for location in list(game.game_map):
+            self.assertEqual([str(unit) for unit in game.game_map[location]], [str(unit) for unit in copy.game_map[location]], "Units differ at {}".format(location))
+
+    def test_rollout_pool(self):
+        game = self.make_random_map(5, 0.15)
+        candidates = [[("PI", location, 5, 0)] for location in [[13, 0], [14, 0], [3, 10], [24, 10]]]
+        sequential = RolloutPool(game.config, 0).evaluate(game, candidates)
+        pool = RolloutPool(game.config, 2)
+        try:
+            self.assertEqual(sequential, pool.evaluate(game, candidates), "The worker processes should score like the sequential rollouts")
+            self.assertEqual((None, None, [None] * 4), pool.evaluate(game, candidates, time_limit=-1), "Nothing should be scored after the deadline")
+        finally:
+            pool.close()
+
+    def test_turn_budget(self):
+        game = self.make_random_map(9, 0.2)
+        budget = TurnBudget.from_config(game.config)
+        self.assertEqual(math.inf, budget.remaining(), "The clock should not run before the first turn")
+        budget.start()
+        self.assertAlmostEqual(5 - budget.safety_margin, budget.remaining(), 1, "The limit should come from waitTimeBotSoft")
+        with budget.deadline(1):
+            self.assertLessEqual(budget.remaining(), 1, "A nested deadline should shorten the budget")
+            with budget.deadline(10):
+                self.assertLessEqual(budget.remaining(), 1, "A nested deadline should not extend the enclosing one")
+        self.assertGreater(budget.remaining(), 1, "The deadline should be restored after the with block")
+
+    def test_anytime_functions(self):
+        game = self.make_random_map(9, 0.2)
+        game.budget = TurnBudget.from_config(game.config)
+        game.budget.start()
+        locations = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT)
+        with game.budget.deadline(0):
+            self.assertEqual([None] * len(locations), game.find_paths_to_edge_batch(locations), "No paths should be found after the deadline")
+            self.assertFalse(game.threat_map(0).complete, "The threat map should be marked incomplete")
+        self.assertEqual(0, len(game.path_cache), "Unfinished paths should not be cached")
+        self.assertTrue(game.threat_map(0).complete, "The threat map should be complete with time left")
+
+    def test_spawn_location_after_deadline(self):
+        from algo_strategy import AlgoStrategy
+        game = self.make_random_map(9, 0.2)
+        game.budget = TurnBudget(0, 0)
+        game.budget.start()
+        options = [[13, 0], [14, 0], [5, 8], [22, 8]]
+        location = AlgoStrategy().least_damage_spawn_location(game, options)
+        self.assertEqual(options[0], location, "The first option should be used when no path was found in time")
+
+    def test_lazy_state(self):
+        game = self.make_random_map(11, 0.2)
+        game.attempt_upgrade(list(game.game_map)[::4])
+        turn_string = snapshot(game)
+        eager = GameState(game.config, turn_string)
+        lazy = GameState(game.config, turn_string, lazy=True)
+        self.assertNotIn("game_map", vars(lazy), "The map should not be built before it is used")
+        self.assertEqual((eager.turn_number, eager.my_health, eager.enemy_time, eager.get_resources(1)),
+                         (lazy.turn_number, lazy.my_health, lazy.enemy_time, lazy.get_resources(1)), "Scalar fields differ")
+        self.assertEqual(game.game_map.count_structures(1), sum(len(units) for units in lazy.raw_units(1)[:3]), "Raw units are missing structures")
+        self.assertNotIn("game_map", vars(lazy), "Raw units should not build the map")
+        self.assertEqual(eager.game_map.layout_key(), lazy.game_map.layout_key(), "The lazily built map differs")
+        self.assertEqual(eager.game_map.upgraded_mask(), lazy.game_map.upgraded_mask(), "The lazily built map lost upgrades")
+
+    def run_algo(self, algo, lines):
+        stdin, stderr = sys.stdin, sys.stderr
+        sys.stdin, sys.stderr = io.StringIO("\n".join(lines) + "\n"), io.StringIO()
+        try:
+            algo.start()
+        finally:
+            sys.stdin, sys.stderr = stdin, stderr
+
+    def test_background_reader(self):
+        game = self.make_turn_0_map()
+        turn = snapshot(game)
+
+        class ThreadedAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.threaded_input = True
+                self.states = []
+                self.parsed = []
+
+            def on_turn(self, turn_state):
+                self.parsed.append(self.parsed_state)
+                self.states.append(GameState(self.config, turn_state, self.budget, parsed_state=self.parsed_state))
+
+        algo = ThreadedAlgo()
+        self.run_algo(algo, [json.dumps(game.config), turn, '{"turnInfo":[2,0,0]}'])
+        self.assertEqual([json.loads(turn)], algo.parsed, "The turn state should be decoded by the reader")
+        self.assertIsNotNone(algo.states[0].budget.started, "The budget should start when the turn is read")
+        self.assertEqual(game.game_map.layout_key(), algo.states[0].game_map.layout_key(), "The pre-decoded turn state was parsed wrong")
+
+    def test_algocore_decodes_once(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(1, get_state_type('{"p1Units":[[[0,13,75,"1"]]],"turnInfo": [ 1, 3, 12]}'), "The message type should be read from turnInfo")
+
+        class FrameAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.frames = []
+                self.turns = []
+
+            def on_turn(self, turn_state):
+                self.turns.append(GameState(self.config, turn_state, self.budget, lazy=True).turn_number)
+
+            def on_action_frame_parsed(self, action_frame, action_frame_game_state):
+                self.frames.append(action_frame["turnInfo"])
+
+        frame = '{"turnInfo":[1,3,%d],"p1Stats":[30,0,0,0],"p2Stats":[30,0,0,0],"p1Units":[],"p2Units":[],"events":{}}'
+        lines = [json.dumps(game.config), snapshot(game).replace('"turnInfo":[0,0,', '"turnInfo":[0,3,'), frame % 0, frame % 1, '{"turnInfo":[2,3,2]}']
+        for threaded in [False, True]:
+            algo = FrameAlgo()
+            algo.threaded_input = threaded
+            self.run_algo(algo, lines)
+            self.assertEqual([3], algo.turns, "on_turn should get the turn string")
+            self.assertEqual([[1, 3, 0], [1, 3, 1]], algo.frames, "on_action_frame_parsed should get decoded frames")
+
+    def test_frame_subscriptions(self):
+        game = self.make_turn_0_map()
+        frame = '{"p1Units":[[[13,2,75,"1"]]],"turnInfo":[1,3,%d],"events":{"breach":%s,"death":[[[1,2],3,"9",2,false]],"damage":[]}}'
+        extracted = extract_fields(frame % (0, "[]"), ["turnInfo", "breach", "p1Units", "melee"])
+        self.assertEqual({"turnInfo": [1, 3, 0], "breach": [], "p1Units": [[[13, 2, 75, "1"]]], "melee": None}, extracted, "Fields were not extracted")
+
+        class BreachAlgo(AlgoCore):
+            def __init__(self, summary):
+                super().__init__()
+                self.frame_events = ["breach"]
+                self.frame_summary = summary
+                self.seen = []
+                self.decoded = []
+
+            def on_turn(self, turn_state):
+                self.seen.append("turn")
+
+            def on_frame_events(self, frame, action_frame_game_state):
+                self.seen.append(frame)
+                self.decoded.append(self.parsed_state)
+
+            def on_action_phase_summary(self, summary, frame_count):
+                self.seen.append((summary, frame_count))
+
+        breach = '[[[13,27],1,3,"7",1]]'
+        turn = snapshot(game)
+        lines = [json.dumps(game.config), turn, frame % (0, "[]"), frame % (1, breach), frame % (2, "[]"), turn, '{"turnInfo":[2,3,3]}']
+        for summary, threaded in [(False, False), (True, False), (False, True), (True, True)]:
+            algo = BreachAlgo(summary)
+            algo.threaded_input = threaded
+            self.run_algo(algo, lines)
+            if summary:
+                expected = ["turn", ({"breach": json.loads(breach)}, 3), "turn"]
+            else:
+                expected = ["turn", {"turnInfo": [1, 3, 1], "breach": json.loads(breach)}, "turn"]
+            self.assertEqual(expected, algo.seen, "Wrong frame callbacks with frame_summary={}".format(summary))
+            self.assertEqual([] if summary else [None], algo.decoded, "Subscribed frames should not be decoded whole by the reader")
+
+    def test_action_phase_tracker(self):
+        def frame(number, p1_units, p2_units):
+            return {"turnInfo": [1, 4, number], "p1Units": p1_units + [[], []], "p2Units": p2_units + [[], []]}
+
+        tracker = ActionPhaseTracker()
+        tracker.update(frame(0, [[[13, 12, 75.0, "1"]], [], [], [[13, 0, 15.0, "2"]], [], []], [[], [], [[14, 17, 75.0, "3"]], [], [], []]))
+        self.assertEqual(["1", "2", "3"], tracker.spawned, "Every unit should spawn in the first frame")
+        self.assertEqual([2, 1, 14, 17, 75.0], tracker.units["3"], "Wrong unit record")
+
+        tracker.update(json.dumps(frame(1, [[[13, 12, 70.0, "1"]], [], [], [[13, 1, 18.0, "2"]], [], []], [[], [], [[14, 17, 75.0, "3"]], [[14, 27, 15.0, "4"]], [], []])))
+        self.assertEqual((4, 1), (tracker.turn_number, tracker.frame_number), "Wrong frame")
+        self.assertEqual(["4"], tracker.spawned, "Only the new scout should have spawned")
+        self.assertEqual({"2": [13, 0]}, tracker.moved, "The scout should have moved")
+        self.assertEqual({"1": 75.0}, tracker.damaged, "The wall should have been damaged")
+        self.assertEqual({"2": 15.0}, tracker.shielded, "The scout should have been shielded")
+        self.assertEqual(["2"], tracker.units_at([13, 1]), "The scout should be found at its new location")
+        self.assertEqual([], tracker.units_at([13, 0]), "The scout should have left its old location")
+
+        tracker.update(frame(2, [[], [], [], [[13, 2, 18.0, "2"]], [], []], [[], [], [[14, 17, 75.0, "3"]], [[14, 26, 15.0, "4"]], [], []]))
+        self.assertEqual({"1": [0, 0, 13, 12, 70.0]}, tracker.died, "The wall should have died")
+        self.assertEqual(["2", "3", "4"], sorted(tracker.units), "Dead units should be forgotten")
+        self.assertEqual({}, tracker.damaged, "Deltas should only describe the last frame")
+
+    def test_unit_stats(self):
+        game = self.make_turn_0_map()
+        first, second = GameUnit("DF", game.config, 0), GameUnit("DF", game.config, 1, 30.0, 3, 12)
+        self.assertIs(first.stats, second.stats, "Units of the same type should share their stats")
+        self.assertEqual((game.config["unitInformation"][2]["startHealth"], 30.0), (first.health, second.health), "Wrong starting health")
+        second.upgrade()
+        upgrade = game.config["unitInformation"][2]["upgrade"]
+        self.assertTrue(second.upgraded and not first.upgraded, "Only the upgraded unit should change")
+        self.assertEqual(upgrade.get("attackDamageWalker", first.damage_i), second.damage_i, "Upgraded damage should come from the config")
+        self.assertEqual([first.cost[0] + upgrade.get("cost1", 0), first.cost[1] + upgrade.get("cost2", 0)], second.cost, "The upgrade cost should be added")
+        with self.assertRaises(AttributeError):
+            first.note = "Units have slots instead of a __dict__"
+
+    def test_rules_table(self):
+        game = self.make_random_map(17, 0.3)
+        rules = game.rules
+        self.assertIs(load_rules(game.config), rules, "The config should only be compiled once")
+        for unit_type in ["FF", "EF", "DF", "PI", "EI", "SI"]:
+            unit_def = game.config["unitInformation"][rules.type_ids[unit_type]]
+            self.assertEqual([unit_def.get("cost1", 0), unit_def.get("cost2", 0)], game.type_cost(unit_type), "Wrong cost for {}".format(unit_type))
+        self.assertEqual([4.0, 0], game.type_cost("DF", True), "Wrong upgrade cost")
+        self.assertEqual([1.0, 0], game.type_cost("FF", True), "Upgrades without a cost should cost the same as the unit")
+        self.assertEqual(4.5, rules.max_attack_range, "Wrong max range")
+        all_units = [unit for location in game.game_map for unit in game.game_map[location]]
+        for location in random.Random(17).sample(list(game.game_map), 30):
+            for player_index in [0, 1]:
+                expected = [unit for unit in all_units if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index
+                            and game.game_map.distance_between_locations(location, [unit.x, unit.y]) <= unit.attackRange]
+                got = game.get_attackers(location, player_index)
+                self.assertEqual(sorted(map(id, expected)), sorted(map(id, got)), "Wrong attackers of {}".format(location))
+
+    def test_get_target(self):
+        for seed in range(3):
+            game = self.make_random_map(seed, 0.25)
+            rng = random.Random(seed)
+            for location in rng.sample(list(game.game_map), 80):
+                if not game.contains_stationary_unit(location):
+                    game.game_map.add_unit(rng.choice(["PI", "EI", "SI"]), location, rng.randint(0, 1))
+                    game.game_map[location][-1].health = rng.choice([5.0, 10.0])
+            units = [unit for location in game.game_map for unit in game.game_map[location]]
+            for attacker in units:
+                # The unit scanned first wins ties, as when looping over get_locations_in_range
+                expected, expected_key = None, None
+                for location in game.game_map.get_locations_in_range([attacker.x, attacker.y], attacker.attackRange):
+                    for unit in game.game_map[location]:
+                        if unit.player_index == attacker.player_index or (attacker.damage_f if unit.stationary else attacker.damage_i) == 0:
+                            continue
+                        key = (unit.stationary, (unit.x - attacker.x) ** 2 + (unit.y - attacker.y) ** 2, unit.health,
+                               unit.y if attacker.player_index == 0 else -unit.y, -abs(13.5 - unit.x))
+                        if expected is None or key < expected_key:
+                            expected, expected_key = unit, key
+                self.assertIs(expected, game.get_target(attacker), "Wrong target for {}".format(attacker))
+
+    def test_get_target_of_appended_units(self):
+        game = self.make_turn_0_map()
+        turret = GameUnit("DF", game.config, 0, None, 13, 12)
+        scout = GameUnit("PI", game.config, 1, None, 13, 14)
+        game.game_map[13, 12].append(turret)
+        game.game_map[13, 14].append(scout)
+        self.assertIs(scout, game.get_target(turret), "Units appended to the lists should be targeted")
+        self.assertEqual([turret], game.get_attackers([13, 14], 1), "get_attackers should agree with get_target")
+        self.assertEqual([scout], game.get_targets([turret]), "get_targets should see appended units too")
+
+    def test_incremental_path_repair(self):
+        for seed in range(3):
+            game = self.make_random_map(seed, 0.2)
+            game.suppress_warnings(True)
+            rng = random.Random(seed)
+            locations = list(game.game_map)
+            finder = game._shortest_path_finder
+            for step in range(15):
+                game.begin()
+                for location in rng.sample(locations, 3):
+                    if game.contains_stationary_unit(location):
+                        game.game_map.remove_unit(location)
+                    else:
+                        game.game_map.add_unit("FF", location, 0 if location[1] < 14 else 1)
+                for start in rng.sample(locations, 15):
+                    if game.contains_stationary_unit(start):
+                        continue
+                    end_points = game.game_map.get_edge_locations(game.get_target_edge(start))
+                    expected = GridPathFinder().navigate_multiple_endpoints(start, end_points, game)
+                    self.assertEqual(expected, finder.navigate_multiple_endpoints(start, end_points, game), "Repaired path differs on seed {}".format(seed))
+                if step % 2:
+                    game.rollback()
+                else:
+                    game.commit()
+            fresh = GridPathFinder()
+            fresh.initialize_map(game)
+            for sources, field in finder._edge_fields.values():
+                self.assertEqual(fresh._validate(sources, [-1] * len(field)), field, "Repaired field differs on seed {}".format(seed))
+
+    def test_rank_blocking_tiles(self):
+        game = self.make_random_map(2, 0.15)
+        game.suppress_warnings(True)
+        starts = [location for location in [[13, 27], [14, 27], [7, 20]] if not game.contains_stationary_unit(location)]
+        candidates = [location for location in random.Random(2).sample(list(game.game_map), 60) if location[1] < 14]
+        layout = game.game_map.layout_key()
+        ranked = game.rank_blocking_tiles(starts, candidates)
+        self.assertEqual(layout, game.game_map.layout_key(), "The walls tried should all be removed")
+        self.assertEqual(sorted(location for location in candidates if not game.game_map[location]), sorted(tile.location for tile in ranked), "Every free candidate should be ranked")
+        self.assertEqual(sorted(ranked, key=lambda tile: (-tile.damage, -tile.steps)), ranked, "Tiles should be ranked by damage then steps")
+        threat = game.threat_map(1)
+        for tile in ranked:
+            trial = game.fork()
+            trial.game_map.add_unit("FF", tile.location, 0)
+            paths = [GridPathFinder().navigate_multiple_endpoints(start, trial.game_map.get_edge_locations(trial.get_target_edge(start)), trial) for start in starts]
+            self.assertEqual(paths, tile.paths, "Wrong paths with a wall at {}".format(tile.location))
+            self.assertEqual(sum(threat.path_damage(path) for path in paths), tile.damage, "Wrong damage with a wall at {}".format(tile.location))
+        ranked = game.rank_blocking_tiles([[13, 0]], [[13, 0], [14, 1]])
+        self.assertEqual([[14, 1]], [tile.location for tile in ranked], "A start location should not be tried as a wall")
+        budget = TurnBudget(0, 0)
+        budget.start()
+        game.budget = budget
+        self.assertEqual([], game.rank_blocking_tiles(starts, candidates), "Nothing should be tried once the budget has run out")
+
+    def test_path_table(self):
+        games = [self.make_random_map(seed, 0.1) for seed in range(3)]
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            self.assertEqual(4, build_path_table(games[0].config, [game.game_map.layout_key() for game in games], filename), "The empty board should be added")
+            table = PathTable(filename)
+            for game in games + [self.make_turn_0_map()]:
+                self.assertIn(game.game_map.layout_key(), table, "Every layout should be in the table")
+                starts = [list(location) for edge in EDGES for location in edge if not game.contains_stationary_unit(location)]
+                expected = [game.find_path_to_edge(start) for start in starts]
+                game.path_cache.clear()
+                game.set_path_finder(None)
+                game.path_table = table
+                # With no path finder, every path has to come from the table
+                self.assertEqual(expected, [game.find_path_to_edge(start) for start in starts], "Table paths should match searched paths")
+            self.assertIsNone(table.get(games[0].game_map.layout_key(), [13, 0], games[0].game_map.BOTTOM_LEFT), "Only the default target edge is stored")
+            self.assertIsNone(table.get(self.make_random_map(9, 0.1).game_map.layout_key(), [13, 0], games[0].game_map.TOP_LEFT), "Unknown layouts should miss")
+            table.close()
+            with open(filename, "rb") as table_file:
+                built = table_file.read()
+            for contents in [b"not a table", b"", b"C1PT", built[:200]]:
+                with open(filename, "wb") as table_file:
+                    table_file.write(contents)
+                with self.assertRaises(ValueError):
+                    PathTable(filename)
+        finally:
+            os.remove(filename)
+
+    def test_resolve_all_targets(self):
+        game = self.make_random_map(4, 0.3)
+        game.suppress_warnings(True)
+        rng = random.Random(4)
+        for location in rng.sample(list(game.game_map), 60):
+            if not game.contains_stationary_unit(location):
+                game.game_map.add_unit(rng.choice(["PI", "EI", "SI"]), location, rng.randint(0, 1), rng.randint(1, 3))
+        for player_index in [0, 1]:
+            resolved = game.resolve_all_targets(player_index)
+            units = [unit for location in game.game_map for unit in game.game_map[location]]
+            attackers = [unit for unit in units if unit.player_index == player_index and unit.damage_i + unit.damage_f > 0]
+            self.assertEqual(sorted(map(id, attackers)), sorted(id(attacker) for attacker, _ in resolved), "Every attacker should be resolved")
+            for attacker, target in resolved:
+                self.assertIs(game.get_target(attacker), target, "Wrong target for {}".format(attacker))
+        self.assertEqual([None], game.get_targets(["not a unit"]), "Invalid attackers should have no target")
+
+    def test_unit_table(self):
+        game = self.make_random_map(13, 0.3)
+        game.attempt_upgrade(list(game.game_map)[::3])
+        game.attempt_remove(list(game.game_map)[::7])
+        table = GameState(game.config, snapshot(game), lazy=True).unit_table()
+        units = [unit for location in list(game.game_map) for unit in game.game_map[location]]
+        self.assertEqual(len(units), len(table), "Every unit should have a row")
+        for unit_type in [None, "FF", "DF"]:
+            for player_index in [0, 1]:
+                for valid_x, valid_y, upgraded in [(None, None, None), (range(14), [14, 15], None), ([3, 20, 21], range(10, 18), True)]:
+                    expected = [unit for unit in units if unit.player_index == player_index and (unit_type is None or unit.unit_type == unit_type)
+                                and (valid_x is None or unit.x in valid_x) and (valid_y is None or unit.y in valid_y) and (upgraded is None or unit.upgraded == upgraded)]
+                    got = table.rows(player_index=player_index, unit_type=unit_type, x_range=valid_x, y_range=valid_y, upgraded=upgraded)
+                    self.assertEqual(sorted([unit.x, unit.y] for unit in expected), sorted([table.x[row], table.y[row]] for row in got),
+                                     "Wrong units for {} {} {} {} {}".format(player_index, unit_type, valid_x, valid_y, upgraded))
+        self.assertEqual(sum(unit.pending_removal for unit in units), sum(table.pending_removal), "Removals were not marked")
+        self.assertEqual(table.count(player_index=1, region=bitboard.TOP_HALF), bitboard.popcount(game.game_map.structures_of(1), bitboard.TOP_HALF), "Region filter is wrong")
+
+        state = json.loads(snapshot(game))
+        direct = UnitTable(game.config, state["p1Units"], state["p2Units"])
+        self.assertEqual((table.type_id, table.player_index, table.x, table.y, table.upgraded), (direct.type_id, direct.player_index, direct.x, direct.y, direct.upgraded),
+                         "A table built from the unit lists should match GameState.unit_table")
+        self.assertEqual(sorted([unit.x, unit.y] for unit in units), sorted(direct.locations()), "locations should give the location of every unit")
+
+    def test_fork(self):
+        game = self.make_random_map(17, 0.2)
+        game.game_map.add_unit("DF", [13, 10], 0)
+        before = [str(unit) for location in list(game.game_map) for unit in game.game_map[location]]
+        layout, resources = game.game_map.layout_key(), game.get_resources()
+
+        child = game.fork()
+        self.assertEqual(before, [str(unit) for location in list(game.game_map) for unit in game.game_map[location]], "Forking should not change the parent")
+        self.assertIs(game.game_map[3, 10], child.game_map[3, 10], "Reading the parent should not copy its columns")
+        self.assertEqual(1, child.attempt_upgrade([13, 10]), "The fork should upgrade its turret")
+        child.attempt_spawn("FF", [[12, 11], [15, 11]])
+        child.attempt_remove([13, 10])
+        child.attempt_spawn("PI", [13, 0], 3)
+        self.assertEqual(before, [str(unit) for location in list(game.game_map) for unit in game.game_map[location]], "The parent map should not change")
+        self.assertEqual((layout, resources, [], []), (game.game_map.layout_key(), game.get_resources(), game._build_stack, game._deploy_stack), "The parent state should not change")
+        self.assertFalse(game.game_map[13, 10][0].upgraded, "The parent's turret should not be upgraded")
+        self.assertTrue(child.game_map[13, 10][0].upgraded, "The fork's turret should be upgraded")
+        self.assertEqual(4, len(child._build_stack), "The fork should have its own build stack")
+        self.assertIs(game.game_map[3, 10], child.game_map[3, 10], "Columns the fork did not change should stay shared")
+
+        game.game_map.remove_unit([13, 10])
+        self.assertTrue(child.contains_stationary_unit([13, 10]), "Changes to the parent should not reach the fork")
+        grandchild = child.fork()
+        grandchild.game_map.remove_unit([12, 11])
+        self.assertTrue(child.contains_stationary_unit([12, 11]), "Forks of forks should be independent")
+
+    def state_summary(self, game):
+        units = [str(unit) for location in list(game.game_map) for unit in game.game_map[location]]
+        masks = (game.game_map.layout_key(), game.game_map.upgraded_mask(), game.game_map.structures_of(0), game.game_map.units_of(0, "PI"))
+        return units, masks, game.get_resources(), list(game._build_stack), list(game._deploy_stack)
+
+    def test_transactions(self):
+        game = self.make_random_map(19, 0.2)
+        game.suppress_warnings(True)
+        game.game_map.add_unit("DF", [13, 10], 0)
+        before = self.state_summary(game)
+        game.begin()
+        game.attempt_upgrade([[13, 10]] + list(game.game_map)[:40])
+        game.attempt_spawn("FF", [[12, 11], [15, 11], [13, 10]])
+        game.begin()
+        game.attempt_spawn("PI", [[13, 0], [14, 0]], 2)
+        game.game_map.remove_unit([13, 10])
+        inner = self.state_summary(game)
+        game.begin()
+        game.attempt_remove([[12, 11]])
+        game.game_map[15, 11] = []
+        game.rollback()
+        self.assertEqual(inner, self.state_summary(game), "The innermost rollback should only undo its own changes")
+        game.commit()
+        self.assertNotEqual(before, self.state_summary(game), "Committed changes should stay")
+        game.rollback()
+        self.assertEqual(before, self.state_summary(game), "The outer rollback should undo the committed changes too")
+        self.assertFalse(game.game_map[13, 10][0].upgraded, "The upgrade should be undone")
+
+        child = game.fork()
+        child.begin()
+        child.attempt_upgrade([13, 10])
+        child.rollback()
+        self.assertEqual(self.state_summary(game), self.state_summary(child), "Rolling back a fork should restore it")
+
+        game.begin()
+        game.attempt_upgrade([13, 10])
+        upgraded = self.state_summary(game)
+        child = game.fork()
+        game.rollback()
+        self.assertEqual(before, self.state_summary(game), "The parent should roll back the upgrade")
+        self.assertEqual(upgraded, self.state_summary(child), "Rolling back the parent should not change a fork made in the transaction")
+        self.assertTrue(child.game_map[13, 10][0].upgraded, "The fork's turret should stay upgraded")
+
+    def test_bulk_spawn(self):
+        bulk, single = self.make_turn_0_map(), self.make_turn_0_map()
+        bulk.suppress_warnings(True)
+        single.suppress_warnings(True)
+        self.assertEqual(5, bulk.attempt_spawn("PI", [[13, 0], [14, 0], [3, 3]], 1000), "Only 5 scouts should be affordable")
+        spawned = 0
+        for location in [[13, 0], [14, 0], [3, 3]]:
+            for _ in range(1000):
+                if not single.attempt_spawn("PI", location):
+                    break
+                spawned += 1
+        self.assertEqual(5, spawned, "Spawning scouts one at a time should give the same count")
+        self.assertEqual([("PI", 13, 0, 5)], bulk._deploy_stack, "The scouts should take a single counted entry")
+        self.assertEqual(single.get_resources(), bulk.get_resources(), "Bulk spawns should cost the same")
+        self.assertEqual(len(single.game_map[13, 0]), len(bulk.game_map[13, 0]), "Every scout should be on the map")
+        outputs = []
+        for game in [bulk, single]:
+            stdout, sys.stdout = sys.stdout, io.StringIO()
+            try:
+                game.submit_turn()
+                outputs.append(sys.stdout.getvalue())
+            finally:
+                sys.stdout = stdout
+        self.assertEqual(outputs[1], outputs[0], "The counted entry should be expanded when the turn is submitted")
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
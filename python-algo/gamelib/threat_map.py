@@ -0,0 +1,59 @@
+from .board_tables import ARENA_SIZE, GRID_CELLS, IN_BOUNDS_LOCATIONS, attack_offsets
+
+
+class ThreatMap:
+    """Holds how much damage every location of the board would take each frame
+
+    The damage and attacker counts are stored in flat lists where the location [x, y]
+    is at index x * ARENA_SIZE + y, so summing them along a path is a simple gather.
+
+    Attributes :
+        * player_index (int): The player whose units would be standing on the locations, 0 for you 1 for the enemy
+        * damage (list): The damage a mobile unit at each location takes per frame from the opposing player
+        * attackers (list): The number of the opposing player's units that can attack each location
+        * complete (bool): False if the time budget ran out before every attacker was added
+
+    """
+    def __init__(self, player_index):
+        self.player_index = player_index
+        self.damage = [0] * GRID_CELLS
+        self.attackers = [0] * GRID_CELLS
+        self.complete = True
+
+    def add_attacker(self, unit):
+        """Adds the area covered by a unit to the map
+
+        Args:
+            unit: A GameUnit controlled by the opposing player
+
+        """
+        damage = unit.damage_i
+        x, y = unit.x, unit.y
+        for dx, dy in attack_offsets(unit.attackRange):
+            if (x + dx, y + dy) in IN_BOUNDS_LOCATIONS:
+                index = (x + dx) * ARENA_SIZE + y + dy
+                self.damage[index] += damage
+                self.attackers[index] += 1
+
+    def damage_at(self, location):
+        """The damage a mobile unit at the location takes per frame
+        """
+        return self.damage[location[0] * ARENA_SIZE + location[1]]
+
+    def attackers_at(self, location):
+        """The number of units that can attack the location, the same as len(game_state.get_attackers(location, player_index))
+        """
+        return self.attackers[location[0] * ARENA_SIZE + location[1]]
+
+    def path_damage(self, path):
+        """Estimates the damage a unit takes walking a path, one frame per location
+
+        Args:
+            path: A list of locations, as returned by GameState.find_path_to_edge
+
+        Returns:
+            The sum of the per-frame damage over the locations of the path
+
+        """
+        damage = self.damage
+        return sum(damage[x * ARENA_SIZE + y] for x, y in path)
@@ -0,0 +1,94 @@
+import math
+import time
+from contextlib import contextmanager
+
+
+class TurnBudget:
+    """Keeps track of how much of the engine's per turn time limit is left
+
+    AlgoCore starts the clock as soon as a turn's game state string is read, so the time spent
+    parsing it counts. Going over waitTimeBotSoft costs health, so the limit defaults to that
+    value from the config, minus a safety margin for sending the turn.
+
+    GameState.budget points at the budget of the current turn. Slow gamelib calls
+    (find_paths_to_edge_batch, threat_map, rank_blocking_tiles, RolloutPool.evaluate) check it and return what
+    they have so far instead of overrunning.
+
+    Attributes :
+        * limit (float): The seconds allowed per turn, math.inf for no limit
+        * safety_margin (float): Seconds kept in reserve, remaining() reaches 0 this long before the limit
+        * started (float): The time.time() the current turn started at, None before the first turn
+
+    """
+    def __init__(self, limit=math.inf, safety_margin=0.25):
+        self.limit = limit
+        self.safety_margin = safety_margin
+        self.started = None
+        self.__deadlines = []
+
+    @classmethod
+    def from_config(cls, config, safety_margin=0.25):
+        """Creates a budget using the soft time limit from the game config
+
+        Args:
+            config: The game config
+            safety_margin: Seconds kept in reserve
+
+        Returns:
+            A TurnBudget, without a limit if the config does not have one
+
+        """
+        limit = config.get("timingAndReplay", {}).get("waitTimeBotSoft")
+        return cls(math.inf if limit is None else limit / 1000, safety_margin)
+
+    def start(self, started=None):
+        """Starts the clock for a new turn, dropping any deadlines left over from the previous one
+
+        Args:
+            started: The time.time() the turn started at, now if None
+
+        """
+        self.started = time.time() if started is None else started
+        self.__deadlines = [self.started + self.limit - self.safety_margin]
+
+    def elapsed(self):
+        """The seconds since the turn started
+        """
+        if self.started is None:
+            return 0
+        return time.time() - self.started
+
+    def deadline_time(self):
+        """The time.time() at which the innermost deadline runs out, math.inf if the clock was not started
+        """
+        if not self.__deadlines:
+            return math.inf
+        return self.__deadlines[-1]
+
+    def remaining(self):
+        """The seconds left before the innermost deadline, never negative
+        """
+        return max(0, self.deadline_time() - time.time())
+
+    def expired(self):
+        """True once the innermost deadline has passed
+        """
+        return time.time() >= self.deadline_time()
+
+    @contextmanager
+    def deadline(self, seconds):
+        """Limits the code inside the with block to at most the given number of seconds,
+        and never past the enclosing deadline
+
+            with game_state.budget.deadline(0.5):
+                paths = game_state.find_paths_to_edge_batch(locations)
+
+        Args:
+            seconds: The seconds allowed for the block
+
+        """
+        self.__deadlines.append(min(self.deadline_time(), time.time() + seconds))
+        try:
+            yield self
+        finally:
+            self.__deadlines.pop()
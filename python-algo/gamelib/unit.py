@@ -1,3 +1,9 @@
+from collections import namedtuple
+from operator import attrgetter
+
+from .rules import load_rules
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,9 +15,56 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+UnitStats = namedtuple("UnitStats", ["config", "unit_type", "upgraded", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+                                     "shieldRange", "max_health", "shieldPerUnit", "shieldBonusPerY", "cost"])
+UnitStats.__doc__ = """The stats shared by every unit of a type, upgraded or not. See GameUnit for the meaning of each field.
+cost is a tuple (SP, MP), including the cost of the upgrade for upgraded units."""
+
+_loaded_stats = (None, None)
+
+
+def load_unit_stats(config):
+    """Builds the UnitStats of every unit type, upgraded and not, from the RulesTable of a game config.
+    AlgoCore calls it when the config arrives. The stats of the last config loaded are kept,
+    so creating a unit does not read the config at all.
+
+    Args:
+        config: The game config
+
+    Returns:
+        A dict from (unit type, upgraded) to UnitStats
+
+    """
+    global _loaded_stats
+    if _loaded_stats[0] is config:
+        return _loaded_stats[1]
+    rules = load_rules(config)
+    table = {}
+    for type_id, unit_type in enumerate(rules.unit_types):
+        if rules.unit_category[type_id] is None:
+            continue
+        for upgraded in (False, True):
+            table[(unit_type, upgraded)] = UnitStats(
+                config, unit_type, upgraded, rules.stationary[type_id],
+                rules.speed[upgraded][type_id],
+                rules.damage_f[upgraded][type_id],
+                rules.damage_i[upgraded][type_id],
+                rules.attack_range[upgraded][type_id],
+                rules.shield_range[upgraded][type_id],
+                rules.health[upgraded][type_id],
+                rules.shield_per_unit[upgraded][type_id],
+                rules.shield_bonus_per_y[upgraded][type_id],
+                rules.total_cost[upgraded][type_id])
+    _loaded_stats = (config, table)
+    return table
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats that only depend on the unit type and on whether it is upgraded are read from a
+    shared UnitStats record, so a unit only stores its own position, owner, health and flags.
+
     Attributes :
         * unit_type (string): This unit's type
         * config (JSON): Contains information about the game
@@ -30,51 +83,41 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * stats (UnitStats): The shared stats of this unit's type
 
     """
+    __slots__ = ("unit_type", "player_index", "pending_removal", "x", "y", "health", "stats")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
         self.unit_type = unit_type
-        self.config = config
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.stats = load_unit_stats(config)[(unit_type, False)]
+        self.health = self.stats.max_health if not health else health
 
+    config = property(attrgetter("stats.config"))
+    upgraded = property(attrgetter("stats.upgraded"))
+    stationary = property(attrgetter("stats.stationary"))
+    speed = property(attrgetter("stats.speed"))
+    damage_f = property(attrgetter("stats.damage_f"))
+    damage_i = property(attrgetter("stats.damage_i"))
+    attackRange = property(attrgetter("stats.attackRange"))
+    shieldRange = property(attrgetter("stats.shieldRange"))
+    max_health = property(attrgetter("stats.max_health"))
+    shieldPerUnit = property(attrgetter("stats.shieldPerUnit"))
+    shieldBonusPerY = property(attrgetter("stats.shieldBonusPerY"))
 
-    def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
+    @property
+    def cost(self):
+        return list(self.stats.cost)
 
+    def upgrade(self):
+        self.stats = load_unit_stats(self.stats.config)[(self.unit_type, True)]
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -0,0 +1,132 @@
+from .board_tables import ARENA_SIZE
+
+
+class UnitTable:
+    """Holds every unit of a turn as parallel lists, one entry per unit, built straight from
+    the p1Units and p2Units lists sent by the game engine without creating any GameUnits
+
+    Row i of the table is the unit with type_id[i], player_index[i], x[i], y[i] and so on.
+    Queries take the same filters everywhere, and only look at the rows of the
+    players and types asked for.
+
+        table = game_state.unit_table()
+        table.count(player_index=1, unit_type=TURRET, y_range=range(14, 17))
+
+    Attributes :
+        * unit_types (list): The shorthand of each type id, in the order of config["unitInformation"]
+        * type_id (list): The type id of each unit
+        * player_index (list): The player controlling each unit, 0 for you 1 for your opponent
+        * x (list): The x coordinate of each unit
+        * y (list): The y coordinate of each unit
+        * health (list): The health of each unit
+        * upgraded (list): Whether each unit is upgraded
+        * pending_removal (list): Whether each unit is marked for removal
+        * unit_id (list): The id the game engine gave each unit
+
+    """
+    def __init__(self, config, p1_units, p2_units):
+        """Builds the table
+
+        Args:
+            * config: The game config
+            * p1_units: The p1Units list of a turn or frame
+            * p2_units: The p2Units list of a turn or frame
+
+        """
+        unit_information = config["unitInformation"]
+        self.unit_types = [information.get("shorthand") for information in unit_information]
+        self.__type_ids = {unit_type: type_id for type_id, unit_type in enumerate(self.unit_types)}
+        self.__stationary = [information.get("unitCategory") == 0 for information in unit_information]
+        self.type_id = []
+        self.player_index = []
+        self.x = []
+        self.y = []
+        self.health = []
+        self.upgraded = []
+        self.pending_removal = []
+        self.unit_id = []
+        self.__groups = {}
+
+        remove_id = len(unit_information) - 2
+        upgrade_id = len(unit_information) - 1
+        for player_index, units in enumerate((p1_units, p2_units)):
+            structure_at = {}
+            for type_id in range(min(len(units), remove_id)):
+                rows = self.__groups.setdefault((player_index, type_id), [])
+                for unit in units[type_id]:
+                    row = len(self.type_id)
+                    x, y = int(unit[0]), int(unit[1])
+                    self.type_id.append(type_id)
+                    self.player_index.append(player_index)
+                    self.x.append(x)
+                    self.y.append(y)
+                    self.health.append(float(unit[2]))
+                    self.upgraded.append(False)
+                    self.pending_removal.append(False)
+                    self.unit_id.append(unit[3] if len(unit) > 3 else None)
+                    rows.append(row)
+                    if self.__stationary[type_id]:
+                        structure_at[(x, y)] = row
+            for type_id, flags in ((remove_id, self.pending_removal), (upgrade_id, self.upgraded)):
+                for unit in (units[type_id] if type_id < len(units) else []):
+                    row = structure_at.get((int(unit[0]), int(unit[1])))
+                    if row is not None:
+                        flags[row] = True
+
+    def __len__(self):
+        return len(self.type_id)
+
+    def rows(self, player_index=None, unit_type=None, x_range=None, y_range=None, region=None, upgraded=None, stationary=None):
+        """Finds the units matching every given filter
+
+        Args:
+            * player_index: 0 for your units, 1 for your opponent's, None for both
+            * unit_type: A unit type such as TURRET, or None for every type
+            * x_range: The x coordinates to keep, such as range(14), or None for all
+            * y_range: The y coordinates to keep, or None for all
+            * region: A bitboard of the locations to keep, as used by GameMap, or None for all
+            * upgraded: True or False to keep only upgraded or only not upgraded units, None for both
+            * stationary: True for structures only, False for mobile units only, None for both
+
+        Returns:
+            The rows of the matching units, in table order
+
+        """
+        players = (0, 1) if player_index is None else (player_index,)
+        if unit_type is None:
+            type_ids = [type_id for type_id in range(len(self.unit_types))
+                        if stationary is None or self.__stationary[type_id] == stationary]
+        else:
+            type_id = self.__type_ids.get(unit_type)
+            type_ids = [] if type_id is None or (stationary is not None and self.__stationary[type_id] != stationary) else [type_id]
+        if x_range is not None and not isinstance(x_range, range):
+            x_range = set(x_range)
+        if y_range is not None and not isinstance(y_range, range):
+            y_range = set(y_range)
+
+        xs, ys, flags = self.x, self.y, self.upgraded
+        found = []
+        for player in players:
+            for type_id in type_ids:
+                for row in self.__groups.get((player, type_id), ()):
+                    if x_range is not None and xs[row] not in x_range:
+                        continue
+                    if y_range is not None and ys[row] not in y_range:
+                        continue
+                    if region is not None and not region >> (xs[row] * ARENA_SIZE + ys[row]) & 1:
+                        continue
+                    if upgraded is not None and flags[row] != upgraded:
+                        continue
+                    found.append(row)
+        found.sort()
+        return found
+
+    def count(self, **filters):
+        """The number of units matching the filters, see rows
+        """
+        return len(self.rows(**filters))
+
+    def locations(self, **filters):
+        """The [x, y] of each unit matching the filters, see rows
+        """
+        return [[self.x[row], self.y[row]] for row in self.rows(**filters)]
@@ -1,4 +1,7 @@
 import sys
+import queue
+import threading
+import time
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -21,6 +24,64 @@ def get_command():
         exit()
     return ret
 
+class BackgroundReader:
+    """Reads lines from stdin on a background thread, so they are read and decoded while the algo is busy
+
+    Lines are put in a bounded queue. When the queue is full the thread waits for the algo to
+    catch up instead of holding an unbounded backlog of frames in memory.
+    Note that decoding still needs the GIL, so it only overlaps with time the main thread
+    spends waiting, such as on I/O or on worker processes.
+
+    Attributes :
+        * queue (Queue): The lines read so far, as (time read, line, decoded) tuples, with None once stdin is closed
+
+    """
+    def __init__(self, decode=None, max_lines=256):
+        """Starts the reader thread
+
+        Args:
+            decode: A function called on the reader thread with every line, whose result is passed along with it.
+                Lines it raises a ValueError on get None.
+            max_lines: The number of lines that can wait in the queue
+
+        """
+        self.queue = queue.Queue(max_lines)
+        self.__decode = decode
+        self.__stream = sys.stdin
+        self.__thread = threading.Thread(target=self.__run, name="BackgroundReader", daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while True:
+            try:
+                line = self.__stream.readline()
+            except (EOFError, ValueError):
+                line = ""
+            if line == "":
+                self.queue.put(None)
+                return
+            read_at = time.time()
+            decoded = None
+            if self.__decode is not None:
+                try:
+                    decoded = self.__decode(line)
+                except ValueError:
+                    pass
+            self.queue.put((read_at, line, decoded))
+
+    def get_command(self):
+        """Gets the next line, waiting for one if needed. Like get_command, exits when the game closes stdin.
+
+        Returns:
+            A tuple (time read, line, decoded)
+
+        """
+        item = self.queue.get()
+        if item is None:
+            debug_write("Got EOF, parent game process must have died, exiting for cleanup")
+            exit()
+        return item
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'